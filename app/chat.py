@@ -1,10 +1,19 @@
 class Chat:
+    __slots__ = ("chat_id", "sender", "receiver", "content")
+
     def __init__(self, chat_id, sender, receiver, content):
         self.chat_id = chat_id
         self.sender = sender
         self.receiver = receiver
         self.content = content
 
+    def to_dict(self):
+        return {"chat_id": self.chat_id, "sender": self.sender, "receiver": self.receiver, "content": self.content}
+
+    @staticmethod
+    def from_dict(c):
+        return Chat(c["chat_id"], c["sender"], c["receiver"], c["content"])
+
     @staticmethod
     def create_chat_object(chat_id, sender, receiver, content):
         return Chat(chat_id, sender, receiver, content)
\ No newline at end of file
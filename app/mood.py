@@ -1,10 +1,95 @@
+import datetime
+
+# One byte per day: 0 is "nothing logged", n is MOODS[n - 1]
+MOODS = ("happy", "sad", "angry", "neutral", "excited", "tired")
+MOOD_CODES = {m: i + 1 for i, m in enumerate(MOODS)}
+# Days are counted from here, so a day fits the 32-bit field of data/mood.bin
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def day_number(date):
+    # "YYYY-MM-DD" or a date -> days since EPOCH
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    return date.toordinal() - EPOCH
+
+
+def day_date(day):
+    return datetime.date.fromordinal(day + EPOCH)
+
+
 class Mood:
-    def __init__(self, user_id, moods):
+    # timeline[i] is the mood code of day start + i, from the first to the last logged day.
+    # The [{"date", "mood"}] list of data/mood.json is only built when asked for (moods / to_dict).
+    __slots__ = ("user_id", "start", "timeline")
+
+    def __init__(self, user_id, moods=None, start=0, timeline=None):
         self.user_id = user_id
-        self.moods = moods or []
+        self.start = start
+        self.timeline = bytearray(timeline or b"")
+        for entry in moods or []:
+            self.set(entry["date"], entry["mood"])
+
+    @property
+    def moods(self):
+        return self.between(day_date(self.start), day_date(self.start + len(self.timeline) - 1)) if self.timeline else []
+
+    def to_dict(self):
+        return {"user_id": self.user_id, "moods": self.moods}
+
+    def to_timeline(self):
+        # Record form used by data/mood.bin
+        return {"user_id": self.user_id, "start": self.start, "timeline": bytes(self.timeline)}
+
+    @staticmethod
+    def from_dict(m):
+        if "timeline" in m:
+            return Mood(m["user_id"], start=m["start"], timeline=m["timeline"])
+        return Mood(m["user_id"], m["moods"])
 
     def create_mood_object(user_id, mood):
         return Mood(user_id, mood)
-    
+
     def mood_obj_to_dict(mood_obj):
-        return [m for m in mood_obj.__dict__]
\ No newline at end of file
+        return list(Mood.__slots__)
+
+    def get(self, date):
+        # Mood logged on date, or None
+        i = day_number(date) - self.start
+        code = self.timeline[i] if 0 <= i < len(self.timeline) else 0
+        return MOODS[code - 1] if code else None
+
+    def set(self, date, mood):
+        # Unknown moods aren't stored; the GUI only offers MOODS
+        code = MOOD_CODES.get(mood, 0)
+        day = day_number(date)
+        if not self.timeline:
+            self.start = day
+        elif day < self.start:
+            self.timeline[0:0] = bytes(self.start - day)
+            self.start = day
+        i = day - self.start
+        if i >= len(self.timeline):
+            self.timeline.extend(bytes(i + 1 - len(self.timeline)))
+        self.timeline[i] = code
+
+    def codes(self, first, last):
+        # Mood codes of first..last inclusive, one byte per day, 0 outside what's been logged
+        first, last = day_number(first), day_number(last)
+        if last < first:
+            return b""
+        lo = min(max(first, self.start), last + 1)
+        hi = max(min(last + 1, self.start + len(self.timeline)), lo)
+        return bytes(lo - first) + self.timeline[lo - self.start:hi - self.start] + bytes(last + 1 - hi)
+
+    def between(self, first, last):
+        # Entries dated first..last inclusive, oldest first
+        first_day = day_number(first)
+        return [{"date": day_date(first_day + i).isoformat(), "mood": MOODS[code - 1]}
+                for i, code in enumerate(self.codes(first, last)) if code]
+
+    def latest(self):
+        for i in range(len(self.timeline) - 1, -1, -1):
+            if self.timeline[i]:
+                return {"date": day_date(self.start + i).isoformat(), "mood": MOODS[self.timeline[i] - 1]}
+        return None
\ No newline at end of file
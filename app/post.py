@@ -1,9 +1,21 @@
 class Post:
-    def __init__(self, chat_id, user_id, image_path, datetime):
+    __slots__ = ("chat_id", "user_id", "image_path", "datetime", "status")
+
+    def __init__(self, chat_id, user_id, image_path, datetime, status="ready"):
         self.chat_id = chat_id
         self.user_id = user_id
         self.image_path = image_path or []
         self.datetime = datetime 
+        # "processing" while the upload is still being written, then "ready" (or "failed")
+        self.status = status
+
+    def to_dict(self):
+        return {"chat_id": self.chat_id, "user_id": self.user_id, "image_path": self.image_path, "datetime": self.datetime,
+                "status": self.status}
+
+    @staticmethod
+    def from_dict(p):
+        return Post(p["chat_id"], p["user_id"], p["image_path"], p["datetime"], p.get("status", "ready"))
 
     def create_post_object(chat_id, user_id, image_path, datetime):
         return Post(chat_id, user_id, image_path, datetime)
\ No newline at end of file
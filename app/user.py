@@ -1,4 +1,7 @@
 class User:
+    __slots__ = ("user_id", "username", "password", "name", "gender", "bday", "contact_num", "profile_pic",
+                 "status", "last_active", "remark", "chat_ids", "friends", "friend_request")
+
     def __init__(self, user_id, username, password, name, gender, bday, contact_num, profile_pic, status, last_active, remark, chat_ids, friends, friend_request):
         self.user_id = user_id
         self.username = username
@@ -14,27 +17,29 @@ class User:
         self.chat_ids = chat_ids or []
         self.friends = friends or []
         self.friend_request = friend_request or []
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in User.__slots__}
+
+    @staticmethod
+    def from_dict(u):
+        return User(u["user_id"], u["username"], u["password"], u["name"], u["gender"], u["bday"],
+                    u["contact_num"], u["profile_pic"], u["status"], u["last_active"], u["remark"],
+                    u["chat_ids"], u["friends"], u["friend_request"])
     
     def create_user_object(user_id, username, password, current_dt, chat_ids, friends, friend_request):
         return User(user_id, username, password, "", "", "", "", "", "online", current_dt, "", chat_ids, friends, friend_request)
     
-    def username_validation(username):
-        from manager.manager import Manager
-        manager = Manager()
-
+    def username_validation(manager, username):
         error  = []
-        all_username = [u.username for u in manager.users]
 
-        if username in all_username:
+        if manager.return_user_by_username(username):
             error.append("Username exists")
 
         if error:
             return error
         
     def password_validation(password):
-        from manager.manager import Manager
-        manager = Manager()
-
         error  = []
 
         if len(password) < 8:
@@ -48,30 +53,28 @@ class User:
             return error
         
     def login_user(manager, username, password):
-        all_users = {u.username:u.password for u in manager.users}
+        user = manager.return_user_by_username(username)
         
-        if username not in all_users.keys():
+        if not user:
             return False, "Username not found"
         else:
-            check_user = all_users[username]
-            if password != check_user:
+            if password != user.password:
                 return False, "Username and password don't match"
             else:
                 return True, "Successfully logged in"
         
     def check_id(manager, username):
-        user = next((u for u in manager.user if u.username == username))
+        user = manager.return_user_by_username(username)
         return user.user_id
 
     def check_username(manager, username):
-        all_username = [u.username for u in manager.users]
-        return username in all_username
+        return manager.return_user_by_username(username) is not None
     
     @staticmethod
     def check_req(manager, sender_id, friend_uname):
         # Find the receiver (friend) user object
-        receiver = next((u for u in manager.users if u.username == friend_uname), None)
-        sender = next((u for u in manager.users if u.user_id == sender_id), None)
+        receiver = manager.return_user_by_username(friend_uname)
+        sender = manager.return_user(sender_id)
 
         # Check if user exists
         if not receiver or not sender:
@@ -82,7 +85,7 @@ class User:
             return "self_request"
 
         # Rule 2: Already friends
-        if receiver.user_id in sender.friends:
+        if any(f[1] == receiver.user_id for f in sender.friends):
             return "already_friends"
 
         # Rule 3: Check if a request already exists (pending)
@@ -96,7 +99,7 @@ class User:
     def id_to_object(manager, req_list):
         result = []
         for timestamp, sender_id in req_list:
-            sender_user = next((u for u in manager.users if u.user_id == sender_id), None)
+            sender_user = manager.return_user(sender_id)
             if sender_user:
                 result.append([sender_user, timestamp])
         return result
@@ -111,7 +114,7 @@ class User:
                 user_id = item
                 date = None
 
-            user_obj = next((u for u in manager.users if u.user_id == user_id), None)
+            user_obj = manager.return_user(user_id)
             if user_obj:
                 result.append([user_obj, date])
         return result
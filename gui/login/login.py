@@ -25,9 +25,8 @@ def login():
             if not success:
                 st.error(msg)
             else:
-                current_user = next((u for u in manager.users if u.username == username and u.password == password), None)
-                current_user.status = "online"
-                # manager.save()
+                current_user = manager.return_user_by_username(username)
+                manager.set_status(current_user.user_id, "online")
                 st.session_state.page = "user"
                 st.session_state.user_id = current_user.user_id
                 st.rerun()
\ No newline at end of file
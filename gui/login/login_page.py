@@ -1,11 +1,22 @@
+import os
 import streamlit as st
 from manager.manager import Manager
 
 st.set_page_config(layout='wide', page_title='EchoLink')
 
+@st.cache_resource
+def get_manager():
+    # One Manager per server process, shared by every browser session
+    manager = Manager()
+    # $ECHOLINK_RECOMMEND_PRECOMPUTE=<seconds> keeps online users' recommendations warm
+    interval = os.environ.get("ECHOLINK_RECOMMEND_PRECOMPUTE")
+    if interval:
+        manager.start_recommendation_worker(float(interval))
+    return manager
+
 def login_page():
     if "manager" not in st.session_state:
-        st.session_state.manager = Manager()
+        st.session_state.manager = get_manager()
 
     if "page" not in st.session_state:
         st.session_state.page = "login"
@@ -1,13 +1,47 @@
-import datetime
 import streamlit as st
 import os
-from streamlit_autorefresh import st_autorefresh
 from app.user import User
+from manager.events import user_topic, conversation_topic
+from gui.user.refresh import rerun_on_change
+
+CHAT_PAGE_SIZE = 30
+
+
+def load_messages(manager, user_id, friend_id):
+    # Per-session window onto the open conversation: starts at the newest page,
+    # reruns only fetch what arrived since the last message held.
+    # Keyed by both users, so a different login in the same browser never sees it.
+    cache = st.session_state.chat_cache
+    key = conversation_topic(user_id, friend_id)
+    if cache.get("key") != key or _dropped(manager, user_id, friend_id, cache["messages"]):
+        cache["key"] = key
+        cache["messages"] = manager.get_chat_page(user_id, friend_id, None, CHAT_PAGE_SIZE)
+        cache["has_older"] = len(cache["messages"]) == CHAT_PAGE_SIZE
+    else:
+        last_id = cache["messages"][-1].chat_id if cache["messages"] else 0
+        cache["messages"].extend(manager.get_chat_since(user_id, friend_id, last_id))
+    return cache["messages"]
+
+
+def _dropped(manager, user_id, friend_id, messages):
+    # Unfriending drops every message older than a cut-off, so if the oldest one
+    # held is still stored, none of them were dropped
+    if not messages:
+        return False
+    first_id = messages[0].chat_id
+    return [c.chat_id for c in manager.get_chat_page(user_id, friend_id, first_id + 1, 1)] != [first_id]
+
+
+def load_older_messages(manager, user_id, friend_id):
+    cache = st.session_state.chat_cache
+    first_id = cache["messages"][0].chat_id if cache["messages"] else None
+    older = manager.get_chat_page(user_id, friend_id, first_id, CHAT_PAGE_SIZE)
+    cache["messages"][:0] = older
+    cache["has_older"] = len(older) == CHAT_PAGE_SIZE
+    return cache["messages"]
 
 
 def chat():
-    st_autorefresh(interval=1500)
-
     if "chat_friend" not in st.session_state:
         st.session_state.chat_friend = ""
 
@@ -16,30 +50,27 @@ def chat():
     user_id = st.session_state.user_id
 
     st.subheader("Your Friends")
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
 
-    friends_disp = {user.user_id: user.username for user in manager.users}
+    friend_objs = User.id_to_object_friends(manager, current_user.friends)
 
-    friend_list = [friends_disp[friend] for dt, friend in current_user.friends]
+    friend_list = [u.username for u, dt in friend_objs]
 
-    friend_disp = {f"{u.username}": u.user_id for u in manager.users if str(u.username) in friend_list}
+    friend_disp = {f"{u.username}": u.user_id for u, dt in friend_objs}
 
     if "chat_input" not in st.session_state:
         st.session_state.chat_input = ""
 
     if not friend_list:
         st.warning("You may want to add some friends first 🤔")
+        rerun_on_change(manager, [user_topic(user_id)], interval=1.5, name="chat")
         return
     
     if "friend_id" not in st.session_state:
         st.session_state.friend_id = ""
 
-    if "chat" not in st.session_state:
-        st.session_state.chat = []
-    
-    # --- Load previous chat ---
-    friend_id = st.session_state.friend_id
-    chat_history = manager.get_chat_history(current_user.user_id, friend_id)
+    if "chat_cache" not in st.session_state:
+        st.session_state.chat_cache = {}
 
     # --- Input box ---
     selected_friend = st.selectbox("Select Your Friend", friend_disp.keys())
@@ -47,6 +78,10 @@ def chat():
     st.session_state.chat_friend = friend_id
     chat_friend = manager.return_user(friend_id)
 
+    # Rerun when this conversation, our friend list or the friend's profile changes
+    rerun_on_change(manager, [conversation_topic(user_id, friend_id), user_topic(user_id), user_topic(friend_id)],
+                    interval=1.5, name="chat")
+
     # --- Friend Profile ---
     with st.container(border=True):
         if st.session_state.chat_friend != "":
@@ -60,11 +95,7 @@ def chat():
                 "no": "❌"
             }
                 
-            chat_friend_mood = next((m for m in manager.moods if m.user_id == st.session_state.chat_friend), None)
-            if chat_friend_mood:
-                today_mood_entry = next((m["mood"] for m in chat_friend_mood.moods if m["date"] == datetime.datetime.now().strftime("%Y-%m-%d")), "no")
-            else:
-                today_mood_entry = "no"
+            today_mood_entry = manager.get_mood(st.session_state.chat_friend) or "no"
             # st.info(today_mood_entry)
             friend_mood = mood_emojis[today_mood_entry]
 
@@ -83,10 +114,13 @@ def chat():
                 with col2:
                     st.metric("Remark", chat_friend.remark)
 
+    # --- Load previous chat ---
+    chat_history = load_messages(manager, current_user.user_id, friend_id)
+    if st.session_state.chat_cache["has_older"]:
+        if st.button("Load older messages ⬆️", use_container_width=True):
+            chat_history = load_older_messages(manager, current_user.user_id, friend_id)
+
     with st.form("chat-preview"):
-        # --- Load previous chat ---
-        manager.load_data()
-        chat_history = manager.get_chat_history(current_user.user_id, friend_id)
 
         # No chats found
         if not chat_history:
@@ -112,7 +146,6 @@ def chat():
             if result == "sent":
                 st.session_state.friend_id = friend_id
                 st.session_state.chat_menu = "Chat"
-                st.session_state[f"chat_count_{friend_id}"] = len(manager.get_chat_history(user_id, friend_id))
                 st.session_state.chat_input = ""
                 st.rerun()
             else:
@@ -5,67 +5,37 @@ import google.generativeai as genai
 from datetime import datetime
 import time
 
-# --- Fetch recent mood notes from DB via manager ---
+# --- Recent days of this month's mood calendar via manager ---
 def get_recent_mood_summary(manager, user_id, limit=5):
     try:
-        df = manager.get_monthly_moods_df(user_id).sort_values("date", ascending=False)
-        rows = df.head(limit).to_dict(orient="records")
-        return "\n".join([
-            f"{r['date']} - {r['mood']} ({r.get('note','')})"
-            for r in rows
-        ])
+        today = datetime.now().date().isoformat()
+        events = [e for e in manager.get_month_events(user_id) if e["start"] <= today]
+        return "\n".join(f"{e['start']} - {e['title']}" for e in events[::-1][:limit])
     except Exception as e:
         return f"(Unable to load mood summary: {e})"
 
-# --- Get the latest daily mood from self.mood structure ---
+# --- Get the latest daily mood from the user's Mood record ---
 def get_latest_mood(self_mood, user_id):
-    try:
-        moods_list = next(item["moods"] for item in self_mood["moods"] if item["user_id"] == user_id)
-        if moods_list:
-            latest = moods_list[-1]
-            return f"{latest['date']} - {latest['mood']}"
-    except Exception:
-        pass
+    latest = self_mood.latest() if self_mood else None
+    if latest:
+        return f"{latest['date']} - {latest['mood']}"
     return "No recent mood found."
 
-# --- Get recent mood activity (3, 7, 10, 20 days) ---
-# def get_recent_mood(manager, user_id):
-#     # Get mood records for different day ranges
-#     results = {
-#         3: manager.get_last_n_days_moods(user_id, 3),
-#         7: manager.get_last_n_days_moods(user_id, 7),
-#         10: manager.get_last_n_days_moods(user_id, 10),
-#         20: manager.get_last_n_days_moods(user_id, 20)
-#     }
-
-#     none_counts = {
-#         days: sum(1 for r in moods if r["mood"] is None)
-#         for days, moods in results.items()
-#     }
-#     best_days = min(none_counts, key=none_counts.get)
-#     best_result = results[best_days]
-#     score = calculate_mood_score(best_result)
-#     print("Score", score)
-#     return score
-
-# def calculate_mood_score(mood_data):
-#     # Define mood-to-score mapping
-#     mood_scores = {
-#         "happy": 5,
-#         "excited": 4,
-#         "neutral": 3,
-#         "tired": 2,
-#         "sad": 1,
-#         "angry": 0
-#     }
-#     # Extract valid mood scores (ignore None or unknown moods)
-#     scores = [mood_scores[m["mood"]] for m in mood_data if m["mood"] in mood_scores]
-#     # Handle error
-#     if not scores:
-#         return None
-#     # Calculate mean
-#     mean_score = sum(scores) / len(scores)
-#     return round(mean_score, 2)
+# --- Mood score and trends over 3 / 7 / 10 / 20 / 30 days ---
+def get_recent_mood(manager, user_id):
+    stats = manager.get_mood_stats(user_id)
+    # The window with the most days logged, longest first on ties
+    days = max(stats["coverage"], key=lambda w: (stats["coverage"][w], w))
+    if stats["mean"][days] is None:
+        return "No mood logged recently."
+    lines = [f"Mood score (happy 5 ... angry 0): {stats['mean'][days]:.2f} over the last {days} days "
+             f"({stats['coverage'][days]:.0%} of days logged)"]
+    if stats["wow_delta"] is not None:
+        lines.append(f"Week over week: {stats['wow_delta']:+.2f}")
+    if stats["volatility"] is not None:
+        lines.append(f"Volatility: {stats['volatility']:.2f}")
+    lines.append(f"Logging streak: {stats['streak']} days (longest {stats['longest_streak']})")
+    return "\n".join(lines)
 
 # --- Main function to display the chat UI ---
 def chatbox(manager, user_id, self_mood):
@@ -95,6 +65,7 @@ def chatbox(manager, user_id, self_mood):
     recent_mood = manager.get_last_n_days_moods(user_id, 30)
     mood_summary = get_recent_mood_summary(manager, user_id)
     latest_daily_mood = get_latest_mood(self_mood, user_id)
+    mood_trends = get_recent_mood(manager, user_id)
 
     system_prompt = (
         "Keep everything short, simple, direct\n"
@@ -108,6 +79,7 @@ def chatbox(manager, user_id, self_mood):
         f"Recent mood tracking: {recent_mood}\n"
         f"Recent mood history:\n{mood_summary}\n\n"
         f"Latest daily mood: {latest_daily_mood}\n\n"
+        f"Mood trends:\n{mood_trends}\n\n"
         f"User says: {query}"
     )
 
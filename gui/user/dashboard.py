@@ -1,12 +1,17 @@
 import streamlit as st
 import datetime
-from PIL import Image
+from manager.images import thumbnail_bytes
+from manager.events import user_topic
+from gui.user.refresh import rerun_on_change
+
+POST_PAGE_SIZE = 9
 
 def dashboard():
     # Variables
     manager = st.session_state.manager
     user_id = st.session_state.user_id
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
+    stats = manager.get_user_stats(user_id)
 
     # Session state
     if "uploaded_file" not in st.session_state:
@@ -15,6 +20,9 @@ def dashboard():
     if "uploader_key" not in st.session_state:
         st.session_state.uploader_key = 0
 
+    if "posts_shown" not in st.session_state:
+        st.session_state.posts_shown = POST_PAGE_SIZE
+
     # --- Image ---
     img_path = "wallpaper/wallpaper.png"
     st.image(img_path)
@@ -27,18 +35,13 @@ def dashboard():
         disp1, disp2, disp3 = st.columns(3)
         with disp1:
             st.metric("Username", f"@{current_user.username}")
-
-            friend_count = len(current_user.friends)
-            st.metric("Friends", friend_count)
+            st.metric("Friends", stats["friends"])
         with disp2:
-            friend_request = len(current_user.friend_request)
-            st.metric("Friend Requests", friend_request)
-
-            msg_count = [msg for msg in manager.chat if msg.sender == user_id]
-            st.metric("Total Message Sent", len(msg_count))
+            st.metric("Friend Requests", stats["requests"])
+            st.metric("Total Message Sent", stats["sent"])
         with disp3:
             if current_user.profile_pic:
-                st.image(current_user.profile_pic, width='content', caption="Your Profile Picture")
+                st.image(thumbnail_bytes(current_user.profile_pic, 300), width='content', caption="Your Profile Picture")
             else:
                 st.image("https://cdn-icons-png.flaticon.com/512/3177/3177440.png", width=100, caption="Default Avatar")
 
@@ -60,9 +63,7 @@ def dashboard():
 
             with col2:
                 today = datetime.datetime.now().strftime("%Y-%m-%d")
-                user_moods = manager.get_user_moods(user_id)
-
-                today_entry = next((m for m in user_moods.moods if m['date'] == today), None)
+                today_mood = manager.get_mood(user_id)
 
                 mood_options = ["happy", "sad", "angry", "neutral", "excited", "tired"]
 
@@ -74,8 +75,8 @@ def dashboard():
                     "excited": "Excited 🤩",
                     "tired": "Tired 😴"
                 }
-                if today_entry:
-                    default_mood = mood_emojis[today_entry['mood']]
+                if today_mood:
+                    default_mood = mood_emojis[today_mood]
                     default_index = list(mood_emojis.values()).index(default_mood)
                 else:
                     default_index = 3  # Neutral 😐
@@ -121,23 +122,37 @@ def dashboard():
         st.warning("After uploading, please click the 'X' to remove the previous photo")
         st.write("")
 
-        # Get all path
-        post_paths = manager.get_post(user_id)
+        # Newest posts first, one page at a time
+        posts = manager.get_posts(user_id, 0, st.session_state.posts_shown)
+
+        # The image worker bumps our topic when an upload finishes, so watch it until none are processing
+        if any(post.status == "processing" for post in posts):
+            rerun_on_change(manager, [user_topic(user_id)], interval=2, name="dashboard")
 
-        if post_paths:
+        if posts:
             # Number of columns
             num_cols = 3
 
             # Create columns
             cols = st.columns(num_cols)
 
-            for idx, photo_path in enumerate(post_paths):
+            for idx, post in enumerate(posts):
+                photo_path = post.image_path
+                # Determine which column to put this image in
+                col = cols[idx % num_cols]
+                if post.status == "processing":
+                    col.info("⏳ Still processing this upload...")
+                    continue
+                if post.status == "failed":
+                    col.warning("⚠️ This upload couldn't be processed")
+                    continue
                 try:
-                    # Open image
-                    img = Image.open(photo_path)
-
-                    # Determine which column to put this image in
-                    col = cols[idx % num_cols]
-                    col.image(img, width=300)
+                    # 300 px thumbnail, built on first view if the upload predates thumbnails
+                    col.image(thumbnail_bytes(photo_path, 300))
                 except FileNotFoundError:
                     st.write(f"⚠️ File '{photo_path}' Not Found")
+
+            if stats["posts"] > st.session_state.posts_shown:
+                if st.button("Load more posts ⬇️", use_container_width=True):
+                    st.session_state.posts_shown += POST_PAGE_SIZE
+                    st.rerun()
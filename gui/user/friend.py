@@ -2,13 +2,16 @@ import streamlit as st
 import datetime
 import time
 from app.user import User
-from streamlit_autorefresh import st_autorefresh
+from manager.events import user_topic
+from gui.user.refresh import rerun_on_change
+from gui.user.dashboard import POST_PAGE_SIZE
+from manager.images import thumbnail_bytes
 
 def friend():
     # Variables
     manager = st.session_state.manager
     user_id = st.session_state.user_id
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
     
     tab = ["Add Friend", "View Request", "Edit Status"]
     tab1, tab2, tab3 = st.tabs(tab)
@@ -17,8 +20,9 @@ def friend():
         st.session_state.refresh_active = True
 
     if st.session_state.refresh_active:
-        st_autorefresh(interval=3000, key="auto_refresh_key")
-        # print('refresh')
+        # Requests and friends' statuses live on our own and our friends' user records
+        topics = [user_topic(user_id)] + [user_topic(fid) for dt, fid in current_user.friends]
+        rerun_on_change(manager, topics, interval=3, name="friend")
 
     with tab1:
         col1, col2 = st.columns(2)
@@ -76,26 +80,26 @@ def friend():
                         with col1:
                                 st.subheader(f"@{friend.username}")
                         with col2:
-                            send_req_button = st.button("Follow", width='stretch')
+                            send_req_button = st.button("Follow", width='stretch', key=f"follow_{friend.user_id}")
                             if send_req_button:
-                                check_status = User.check_req(manager, current_user.user_id, add_friend_uname)
+                                check_status = User.check_req(manager, current_user.user_id, friend.username)
 
                                 if check_status == "not_found":
-                                    st.warning(f"@{add_friend_uname} not found!")
+                                    st.warning(f"@{friend.username} not found!")
                                     return
                                 elif check_status == "self_request":
                                     st.warning("You cannot send a friend request to yourself 🤨")
                                     return
                                 elif check_status == "already_friends":
-                                    st.info(f"You are already friends with @{add_friend_uname}")
+                                    st.info(f"You are already friends with @{friend.username}")
                                     return
                                 elif check_status == "already_sent":
-                                    st.warning(f"You have already sent a request to @{add_friend_uname}")
+                                    st.warning(f"You have already sent a request to @{friend.username}")
                                     return
                                 elif check_status == "ok":
-                                    result = manager.add_friend(current_user, add_friend_uname)
+                                    result = manager.add_friend(current_user, friend.username)
                                     if result:
-                                        st.toast(f"Friend request sent to @{add_friend_uname} ✅")
+                                        st.toast(f"Friend request sent to @{friend.username} ✅")
 
         st.divider()
 
@@ -112,8 +116,12 @@ def friend():
                 
                 if st.button("Load Profile 🤩"):
                     st.session_state.refresh_active = False
+                    st.session_state.profile_username = choose_username
+                    st.session_state.profile_posts_shown = POST_PAGE_SIZE
 
-                    friend_obj = next((u for u in manager.users if u.username == choose_username), None)
+                # Kept in session state so "Load more posts" doesn't close the profile
+                if st.session_state.get("profile_username") == choose_username:
+                    friend_obj = manager.return_user_by_username(choose_username)
                     if friend_obj:
                         st.divider()
 
@@ -123,7 +131,7 @@ def friend():
                             with st.container(border=True, height='stretch'):
                                 # Profile Picture
                                 if friend_obj.profile_pic:
-                                    st.image(friend_obj.profile_pic, width=200)
+                                    st.image(thumbnail_bytes(friend_obj.profile_pic, 200), width=200)
                                 else:
                                     st.image("https://cdn-icons-png.flaticon.com/512/3177/3177440.png", width=100, caption="Default Avatar")
 
@@ -138,20 +146,29 @@ def friend():
                             with st.container(border=True, height='stretch'):
                                 # Display User's Posts
                                 st.subheader(f"@{friend_obj.username}'s Posts 🖼️")
-                                # Filter posts by user_id
-                                user_posts = [post for post in manager.posts if post.user_id == friend_obj.user_id]
+                                # Newest posts first, one page at a time
+                                shown = st.session_state.profile_posts_shown
+                                user_posts = manager.get_posts(friend_obj.user_id, 0, shown)
 
                                 if user_posts:
                                     for post in user_posts:
                                         st.markdown(f"**Posted on:** {post.datetime}")
-                                        if post.image_path:
+                                        if post.status == "processing":
+                                            st.info("⏳ Still processing this upload...")
+                                        elif post.status == "failed":
+                                            st.warning("⚠️ This upload couldn't be processed")
+                                        elif post.image_path:
                                             try:
-                                                st.image(post.image_path, width=300)
+                                                st.image(thumbnail_bytes(post.image_path, 300))
                                             except:
                                                 st.warning(f"Fail in loading picture '{post.image_path}'")
                                         else:
                                             st.info("No images in this post.")
                                         st.divider()
+                                    if manager.get_user_stats(friend_obj.user_id)["posts"] > shown:
+                                        if st.button("Load more posts ⬇️", key="profile_more_posts", use_container_width=True):
+                                            st.session_state.profile_posts_shown += POST_PAGE_SIZE
+                                            st.rerun()
                                 else:
                                     st.info("No posts yet 🥹")
                     else:
@@ -190,8 +207,7 @@ def friend():
 
                 if reject_button:
                     # Remove only the request
-                    current_user.friend_request.remove(req)
-                    manager.save_data()
+                    manager.reject_request(current_user, sender)
                     st.info(f"Rejected friend request from @{sender.username}")
                     st.rerun()
         else:
@@ -1,6 +1,5 @@
 import streamlit as st
 import datetime
-import pandas as pd
 import calendar
 from streamlit_calendar import calendar
 from gui.user.chatbox import chatbox
@@ -49,9 +48,7 @@ def moods():
     user_id = st.session_state.user_id
 
     today = datetime.datetime.now().strftime("%Y-%m-%d")
-    user_moods = manager.get_user_moods(user_id)
-
-    today_entry = next((m for m in user_moods.moods if m['date'] == today), None)
+    today_mood = manager.get_mood(user_id)
 
     mood_options = ["happy", "sad", "angry", "neutral", "excited", "tired"]
 
@@ -81,8 +78,8 @@ def moods():
 
     with tab1:
         # Set default index
-        if today_entry:
-            default_mood = mood_emojis[today_entry['mood']]
+        if today_mood:
+            default_mood = mood_emojis[today_mood]
             default_index = list(mood_emojis.values()).index(default_mood)
         else:
             default_index = 3  # Neutral 😐
@@ -128,21 +125,26 @@ def moods():
                         st.success(st.session_state.update_mood_msg)
                         del st.session_state.update_mood_msg
 
+        # --- Mood Trends ---
+        with st.container(border=True):
+            st.header("Mood Trends 📈")
+            stats = manager.get_mood_stats(user_id)
+            week_score, week_delta = stats["mean"][7], stats["wow_delta"]
+            cols = st.columns(4)
+            cols[0].metric("7-Day Score", f"{week_score:.1f} / 5" if week_score is not None else "–",
+                           delta=f"{week_delta:+.1f} vs last week" if week_delta is not None else None)
+            cols[1].metric("Logging Streak", f"{stats['streak']} days", help=f"Longest: {stats['longest_streak']} days")
+            cols[2].metric("30-Day Coverage", f"{stats['coverage'][30]:.0%}")
+            cols[3].metric("Volatility", f"{stats['volatility']:.2f}" if stats["volatility"] is not None else "–",
+                           help="Standard deviation of your mood scores (happy 5 ... angry 0)")
+            st.line_chart({"7-day average score": stats["rolling"][-30:]}, height=200)
+
         st.divider()
 
         # --- Monthly Mood View ---
         with st.container():
             
-            df = manager.get_monthly_moods_df(user_id)
-            # st.info(df)
-            events = []
-            for _, row in df.iterrows():
-                mood = row["mood"]
-                events.append({
-                    "title": row["mood"],
-                    "start": row["date"].isoformat(),
-                    "end": row["date"].isoformat()
-                })
+            events = manager.get_month_events(user_id)
             display_mood_calendar(events)
 
     with tab2:
@@ -2,11 +2,12 @@ import streamlit as st
 import datetime
 from PIL import Image
 from app.user import User
+from manager.images import thumbnail_bytes
 
 def profile():
     manager = st.session_state.manager
     user_id = st.session_state.user_id
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
 
     with st.form("update-form"):
         st.header("Profile")
@@ -14,7 +15,7 @@ def profile():
         # --- Account Info ---
         if current_user.profile_pic and current_user.profile_pic.strip() != "":
             try:
-                st.image(current_user.profile_pic, width=100, caption="Your Profile Picture")
+                st.image(thumbnail_bytes(current_user.profile_pic, 100), width=100, caption="Your Profile Picture")
             except Exception:
                 st.image("https://cdn-icons-png.flaticon.com/512/3177/3177440.png", width=100, caption="Default Avatar")
         else:
@@ -0,0 +1,15 @@
+import streamlit as st
+
+
+def rerun_on_change(manager, topics, interval, name):
+    # Replaces st_autorefresh: a small fragment polls the manager's in-memory
+    # version counters and only reruns the whole page when one of them moved
+    seen_key = f"seen_versions_{name}"
+    st.session_state[seen_key] = manager.changes.versions(topics)
+
+    @st.fragment(run_every=interval)
+    def watch():
+        if manager.changes.versions(topics) != st.session_state[seen_key]:
+            st.rerun()
+
+    watch()
@@ -4,7 +4,7 @@ import json
 def show_json():
     manager = st.session_state.manager
     user_id = st.session_state.user_id
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
     
     with open("data/chat.json", "r") as f:
         users = json.load(f)
@@ -12,7 +12,7 @@ def user_page():
     # Variables
     manager = st.session_state.manager
     user_id = st.session_state.user_id
-    current_user = next((u for u in manager.users if str(u.user_id) == str(user_id)), None)
+    current_user = manager.return_user(user_id)
     # current_user.status = "online"
     # print(f'Set user @{user_id} to ONLINE')
     # current_user.last_active = datetime.datetime.now().strftime("%d/%m/%Y")
@@ -84,11 +84,7 @@ def user_page():
 #         manager.save()
 
 def set_offline(manager, user_id):
-    current_user = next((u for u in manager.users if u.user_id == user_id), None)
-    print(current_user)
-    print(current_user.user_id)
-    current_user.status = "offline"
-    manager.save()
+    manager.set_status(user_id, "offline")
 
 def logout(manager, user_id):
     import time 
@@ -99,6 +95,8 @@ def logout(manager, user_id):
     st.session_state.page = "login"
     st.session_state.username = None
     st.session_state.user_id = ""
+    # Session caches belong to the user logging out
+    st.session_state.pop("chat_cache", None)
     # st.cache_data.clear()
     # st.cache_resource.clear()
     st.session_state.pop("logout_triggered", None)
\ No newline at end of file
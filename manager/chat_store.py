@@ -0,0 +1,167 @@
+import os
+import bisect
+from array import array
+import numpy as np
+from app.chat import Chat
+
+
+def make_chat_store(kind=None, chats=()):
+    # kind falls back to $ECHOLINK_CHAT_STORE, then to the object list
+    kind = kind or os.environ.get("ECHOLINK_CHAT_STORE", "list")
+    if kind == "list":
+        return ChatStore(chats)
+    elif kind == "columnar":
+        return ColumnarChatStore(chats)
+    raise ValueError(f"Unknown chat store '{kind}'")
+
+
+def conversation_key(user_id, friend_id):
+    # Unordered pair, so (a, b) and (b, a) share one conversation
+    try:
+        user_id, friend_id = int(user_id), int(friend_id)
+    except (TypeError, ValueError):
+        user_id, friend_id = str(user_id), str(friend_id)
+    return (user_id, friend_id) if user_id <= friend_id else (friend_id, user_id)
+
+
+class ChatStore:
+    # All chats keyed by chat_id (dicts keep insertion order, so iteration is in id order),
+    # plus a (user_a, user_b) -> [Chat] index per conversation
+    def __init__(self, chats=()):
+        self._chats = {}
+        self._conversations = {}
+        for c in chats:
+            self.append(c)
+
+    def __iter__(self):
+        return iter(self._chats.values())
+
+    def __len__(self):
+        return len(self._chats)
+
+    def __getitem__(self, index):
+        return list(self._chats.values())[index]
+
+    def append(self, chat):
+        self._chats[chat.chat_id] = chat
+        self._conversations.setdefault(conversation_key(chat.sender, chat.receiver), []).append(chat)
+
+    def conversation(self, user_id, friend_id):
+        return list(self._conversations.get(conversation_key(user_id, friend_id), []))
+
+    def since(self, user_id, friend_id, after_chat_id):
+        # Conversations are in chat_id order, so new messages are a tail slice
+        messages = self._conversations.get(conversation_key(user_id, friend_id), [])
+        start = bisect.bisect_right(messages, after_chat_id, key=lambda c: c.chat_id)
+        return messages[start:]
+
+    def page(self, user_id, friend_id, before_chat_id=None, limit=30):
+        # Up to limit messages older than before_chat_id (newest page when None), oldest first
+        messages = self._conversations.get(conversation_key(user_id, friend_id), [])
+        end = len(messages)
+        if before_chat_id is not None:
+            end = bisect.bisect_left(messages, before_chat_id, key=lambda c: c.chat_id)
+        return messages[max(0, end - limit):end]
+
+    def remove_conversation(self, user_id, friend_id, before_chat_id=None):
+        # Drops the conversation (or just its messages older than before_chat_id)
+        # through the index, so the cost is the conversation's length, not the store's
+        key = conversation_key(user_id, friend_id)
+        messages = self._conversations.get(key, [])
+        end = len(messages)
+        if before_chat_id is not None:
+            end = bisect.bisect_left(messages, before_chat_id, key=lambda c: c.chat_id)
+        removed, kept = messages[:end], messages[end:]
+        if kept:
+            self._conversations[key] = kept
+        else:
+            self._conversations.pop(key, None)
+        for c in removed:
+            del self._chats[c.chat_id]
+        return removed
+
+
+class ColumnarChatStore:
+    # Same interface as ChatStore, but chats live in typed arrays (ids, senders,
+    # receivers) plus one UTF-8 pool for the text. Queries are numpy masks over
+    # zero-copy views of the arrays; Chat objects are only built for results.
+    def __init__(self, chats=()):
+        self._ids = array("q")
+        self._senders = array("q")
+        self._receivers = array("q")
+        self._offsets = array("q", [0])
+        self._pool = bytearray()
+        for c in chats:
+            self.append(c)
+
+    def __iter__(self):
+        return (self._chat(i) for i in range(len(self)))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._chat(i) for i in range(len(self))[index]]
+        return self._chat(range(len(self))[index])
+
+    def _chat(self, i):
+        content = self._pool[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+        return Chat(self._ids[i], self._senders[i], self._receivers[i], content)
+
+    def _columns(self):
+        # Views must stay local: an array.array can't grow while a view of it is alive
+        return (np.frombuffer(self._ids, dtype=np.int64),
+                np.frombuffer(self._senders, dtype=np.int64),
+                np.frombuffer(self._receivers, dtype=np.int64))
+
+    def append(self, chat):
+        self._ids.append(chat.chat_id)
+        self._senders.append(chat.sender)
+        self._receivers.append(chat.receiver)
+        self._pool += chat.content.encode("utf-8")
+        self._offsets.append(len(self._pool))
+
+    def _conversation_rows(self, user_id, friend_id):
+        a, b = conversation_key(user_id, friend_id)
+        ids, senders, receivers = self._columns()
+        mask = ((senders == a) & (receivers == b)) | ((senders == b) & (receivers == a))
+        rows = np.flatnonzero(mask)
+        return rows, ids[rows]
+
+    def conversation(self, user_id, friend_id):
+        rows, _ = self._conversation_rows(user_id, friend_id)
+        return [self._chat(i) for i in rows.tolist()]
+
+    def since(self, user_id, friend_id, after_chat_id):
+        rows, ids = self._conversation_rows(user_id, friend_id)
+        start = np.searchsorted(ids, after_chat_id, side="right")
+        return [self._chat(i) for i in rows[start:].tolist()]
+
+    def page(self, user_id, friend_id, before_chat_id=None, limit=30):
+        rows, ids = self._conversation_rows(user_id, friend_id)
+        end = len(rows) if before_chat_id is None else np.searchsorted(ids, before_chat_id, side="left")
+        return [self._chat(i) for i in rows[max(0, end - limit):end].tolist()]
+
+    def remove_conversation(self, user_id, friend_id, before_chat_id=None):
+        rows, ids = self._conversation_rows(user_id, friend_id)
+        if before_chat_id is not None:
+            rows = rows[:np.searchsorted(ids, before_chat_id, side="left")]
+        if not len(rows):
+            return []
+        removed = [self._chat(i) for i in rows.tolist()]
+
+        keep = np.ones(len(self), dtype=bool)
+        keep[rows] = False
+        ids, senders, receivers = self._columns()
+        lengths = np.diff(np.frombuffer(self._offsets, dtype=np.int64))
+        # Expand the row mask to a byte mask so the text pool is compacted in one step
+        pool = np.frombuffer(self._pool, dtype=np.uint8)[np.repeat(keep, lengths)].tobytes()
+        offsets = np.concatenate(([0], np.cumsum(lengths[keep], dtype=np.int64)))
+
+        self._ids = array("q", ids[keep].tobytes())
+        self._senders = array("q", senders[keep].tobytes())
+        self._receivers = array("q", receivers[keep].tobytes())
+        self._offsets = array("q", offsets.astype(np.int64).tobytes())
+        self._pool = bytearray(pool)
+        return removed
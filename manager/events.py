@@ -0,0 +1,61 @@
+import threading
+from manager.chat_store import conversation_key
+
+
+def user_topic(user_id):
+    try:
+        return ("user", int(user_id))
+    except (TypeError, ValueError):
+        return ("user", user_id)
+
+
+def conversation_topic(user_id, friend_id):
+    return ("conversation",) + conversation_key(user_id, friend_id)
+
+
+class ChangeBus:
+    # In-process version counters per topic, with subscribers and blocking waits.
+    # bump_all() moves every topic at once (used when a collection is reloaded from disk).
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._versions = {}
+        self._subscribers = {}
+
+    def version(self, topic):
+        return self._generation, self._versions.get(topic, 0)
+
+    def versions(self, topics):
+        return tuple(self.version(t) for t in topics)
+
+    def bump(self, *topics):
+        with self._cond:
+            for t in topics:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            self._cond.notify_all()
+            callbacks = [(t, cb) for t in topics for cb in self._subscribers.get(t, ())]
+        for t, cb in callbacks:
+            cb(t)
+
+    def bump_all(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+            callbacks = [(t, cb) for t, cbs in self._subscribers.items() for cb in cbs]
+        for t, cb in callbacks:
+            cb(t)
+
+    def subscribe(self, topic, callback):
+        with self._cond:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic, callback):
+        with self._cond:
+            if callback in self._subscribers.get(topic, []):
+                self._subscribers[topic].remove(callback)
+
+    def wait(self, topics, seen, timeout=None):
+        # Blocks until any topic moves past the versions in seen; returns the new versions
+        with self._cond:
+            self._cond.wait_for(lambda: self.versions(topics) != seen, timeout)
+            return self.versions(topics)
@@ -0,0 +1,222 @@
+import io
+import os
+import math
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image, ImageOps
+
+# Uploads are content-addressed: images/<h[:2]>/<h><ext>, where h hashes the uploaded bytes.
+# A path never changes content, identical uploads share one file, and files no
+# Post.image_path / User.profile_pic points at are removed by collect_garbage().
+IMAGE_DIR = "images"
+
+# Derived copies of the uploads, one WebP per size, e.g.
+# thumbnails/ab/ab12..._png_300.webp. They can be deleted at any time;
+# thumbnail() rebuilds whatever is missing or older than its source.
+THUMB_DIR = "thumbnails"
+THUMB_SIZES = (150, 300, 600)
+
+# Uploads are normalized before they're stored: the longest side is capped at
+# MAX_IMAGE_SIDE, metadata other than the colour profile is dropped, and they're
+# re-encoded as progressive JPEG (or WebP when they have transparency).
+# Anything over MAX_UPLOAD_PIXELS is refused from the header, before decoding.
+MAX_IMAGE_SIDE = int(os.environ.get("ECHOLINK_MAX_IMAGE_SIDE", 2048))
+MAX_UPLOAD_PIXELS = 40_000_000
+JPEG_QUALITY = 85
+WEBP_QUALITY = 85
+upload_stats = {"uploads": 0, "bytes_in": 0, "bytes_out": 0}
+
+# Uploads are decoded, re-encoded and thumbnailed here, off the Streamlit script thread.
+# Pillow releases the GIL while it decodes and encodes, so threads are enough.
+_workers = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="echolink-images")
+# path -> Future for images still being written, so a duplicate upload joins the first one
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def image_path(data, ext, image_dir=IMAGE_DIR):
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    return os.path.join(image_dir, digest[:2], digest + ext.lower())
+
+
+def upload_ext(data, fallback):
+    # The stored format, decided from the header alone: WebP keeps transparency, JPEG for the rest
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return ".webp" if img.has_transparency_data else ".jpg"
+    except Exception:
+        return fallback  # not an image; the worker will report it
+
+
+def store_upload(data, ext, image_dir=IMAGE_DIR):
+    # Returns (path, future); future is None when the same image is already stored
+    path = image_path(data, upload_ext(data, ext), image_dir)
+    with _pending_lock:
+        if path in _pending:
+            return path, _pending[path]
+        if os.path.exists(path):
+            return path, None
+        future = _pending[path] = process_upload(data, path)
+    future.add_done_callback(lambda f: _forget_pending(path))
+    return path, future
+
+
+def _forget_pending(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def delete_image(path, image_dir=IMAGE_DIR):
+    # Only files inside the content store are ever deleted
+    if os.path.commonpath([os.path.abspath(path), os.path.abspath(image_dir)]) != os.path.abspath(image_dir):
+        return False
+    for p in [path] + [thumbnail_path(path, size) for size in THUMB_SIZES]:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def collect_garbage(referenced, grace=3600, image_dir=IMAGE_DIR):
+    # Deletes stored images not in referenced. Files younger than grace seconds are kept,
+    # since another process may have written them and not saved its record yet.
+    removed = 0
+    now = time.time()
+    for root, _, files in os.walk(image_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if path in referenced or path in _pending or name.endswith(".tmp"):
+                continue
+            if now - os.stat(path).st_mtime < grace:
+                continue
+            delete_image(path, image_dir)
+            removed += 1
+    return removed
+
+
+def process_upload(data, save_path):
+    # Queues save_upload on the worker pool; returns its Future
+    return _workers.submit(save_upload, data, save_path)
+
+
+def _draft_box(size, box):
+    # The size of img scaled down to fit box. Image.draft() keeps every side at least as big as
+    # the size it's given, so passing the box itself would leave a non-square image at full size.
+    width, height = size
+    scale = min(box[0] / width, box[1] / height, 1)
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def save_upload(data, save_path, max_side=MAX_IMAGE_SIDE):
+    # Decodes the whole upload (so a truncated or fake image fails here, not in the GUI),
+    # writes the normalized image in the format its extension names, then its thumbnails
+    with Image.open(io.BytesIO(data)) as img:
+        # Only the header has been read so far
+        if img.width * img.height > MAX_UPLOAD_PIXELS:
+            raise Image.DecompressionBombError(f"{img.width}x{img.height} is over {MAX_UPLOAD_PIXELS} pixels")
+        src_format, src_size, has_exif = img.format, img.size, "exif" in img.info
+        # JPEG: decode at 1/2..1/8 scale when that still covers max_side on the long side
+        img.draft("RGB", _draft_box(img.size, (max_side, max_side)))
+        icc_profile = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    fmt = Image.registered_extensions().get(os.path.splitext(save_path)[1].lower(), "PNG")
+    if fmt == "JPEG":
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        params = {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}
+    elif fmt == "WEBP":
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        params = {"quality": WEBP_QUALITY, "method": 4}
+    else:
+        params = {"optimize": True}
+    if icc_profile:
+        params["icc_profile"] = icc_profile
+
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    tmp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    img.save(tmp_path, fmt, **params)
+    if src_format == fmt and img.size == src_size and not has_exif and os.path.getsize(tmp_path) > len(data):
+        # Already small and clean; re-encoding only made it bigger
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    os.replace(tmp_path, save_path)
+
+    written = os.path.getsize(save_path)
+    with _pending_lock:
+        upload_stats["uploads"] += 1
+        upload_stats["bytes_in"] += len(data)
+        upload_stats["bytes_out"] += written
+    print(f"Normalize {save_path}: {len(data)} -> {written} bytes ({1 - written / max(len(data), 1):.0%} saved)")
+
+    make_thumbnails(save_path, img=img)
+    return {"path": save_path, "bytes_in": len(data), "bytes_out": written}
+
+
+def thumbnail_path(src_path, size, thumb_dir=THUMB_DIR):
+    folder = os.path.basename(os.path.dirname(os.path.abspath(src_path)))
+    # Keep the extension in the name: 1.png and 1.jpg are different uploads
+    name, ext = os.path.splitext(os.path.basename(src_path))
+    return os.path.join(thumb_dir, folder, f"{name}_{ext.lstrip('.')}_{size}.webp")
+
+
+def pick_size(width):
+    # Smallest thumbnail at least width pixels wide
+    return next((s for s in THUMB_SIZES if s >= width), THUMB_SIZES[-1])
+
+
+def make_thumbnails(src_path, sizes=THUMB_SIZES, thumb_dir=THUMB_DIR, img=None):
+    # Decode the source once (or reuse img, which is shrunk in place) and scale it down
+    # step by step, largest size first
+    if img is None:
+        with Image.open(src_path) as src:
+            # JPEG: let the decoder downscale to the largest thumbnail's box
+            src.draft("RGB", _draft_box(src.size, (max(sizes), max(sizes) * 3)))
+            img = ImageOps.exif_transpose(src)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+
+    paths = []
+    for size in sorted(sizes, reverse=True):
+        # Width is capped at size; very tall images are capped at 3x that in height
+        img.thumbnail((size, size * 3))
+        path = thumbnail_path(src_path, size, thumb_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "WEBP", quality=80)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def thumbnail(src_path, width, thumb_dir=THUMB_DIR):
+    # Path of the thumbnail to show at width px, generated on first use (lazy backfill)
+    size = pick_size(width)
+    path = thumbnail_path(src_path, size, thumb_dir)
+    src_mtime = os.stat(src_path).st_mtime_ns
+    try:
+        if os.stat(path).st_mtime_ns >= src_mtime:
+            return path
+    except FileNotFoundError:
+        pass
+    make_thumbnails(src_path, thumb_dir=thumb_dir)
+    return path
+
+
+def thumbnail_bytes(src_path, width, thumb_dir=THUMB_DIR):
+    # Encoded thumbnail ready for st.image; recently used ones are served from memory
+    path = thumbnail(src_path, width, thumb_dir)
+    return _read_cached(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _read_cached(path, mtime_ns):
+    # mtime_ns is part of the key so a rebuilt thumbnail isn't served stale
+    with open(path, "rb") as f:
+        return f.read()
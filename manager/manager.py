@@ -1,140 +1,307 @@
 import os
-import json
+import time
 import datetime
-import calendar as cal
-import pandas as pd
-from PIL import Image
-from filelock import FileLock
-import random
 import threading
+import calendar as cal
+import bisect
+from collections import Counter
 from app.user import User
 from app.chat import Chat
 from app.post import Post
-from app.mood import Mood
+from app.mood import Mood, MOODS
+from manager.storage import COLLECTIONS, open_storage
+from manager.chat_store import make_chat_store
+from manager.events import ChangeBus, user_topic, conversation_topic
+from manager.rwlock import RWLock, read_locked, write_locked
+from manager.images import store_upload, delete_image, collect_garbage
+from manager.recommend import Recommender
+from manager.mood_stats import DAYS as MOOD_STAT_DAYS, mood_matrix, mood_stats, user_mood_stats
+
+STAT_FIELDS = ("sent", "received", "friends", "requests", "posts")
+# Seconds a user's friend recommendations are reused (mood changes elsewhere only show up after this)
+RECOMMEND_TTL = 300
+# Calendar title per mood code (see app/mood.py); 0 is a day with nothing logged
+CALENDAR_EMOJIS = ("❓", "😊", "😢", "😡", "😐", "🤩", "😴")
 
 class Manager:
     def __init__(self, user_path="data/user.json", chat_path="data/chat.json",
-                 post_path="data/post.json", mood_path="data/mood.json"):
+                 post_path="data/post.json", mood_path="data/mood.json",
+                 chat_fsync="never", compact_every=500, storage=None, db_path=None, chat_store=None):
+        # chat_store: "list" (default) or "columnar"; see manager/chat_store.py
+        self.chat_store = chat_store
         self.users = []
-        self.chat = []
+        self.chat = make_chat_store(chat_store)
+        # user_id -> User and username -> User, kept in step with self.users
+        self._users_by_id = {}
+        self._users_by_name = {}
         self.posts = []
+        # user_id -> [Post], oldest first by (date, post id)
+        self._posts_by_user = {}
         self.moods = []
+        # user_id -> Mood
+        self._moods_by_user = {}
+        # user_id -> number of set_daily_mood calls, and (user_id, year, month) -> (that number, events)
+        self._mood_versions = {}
+        self._month_events = {}
+        # user_id -> ((mood version, day), user_mood_stats)
+        self._mood_stats = {}
+        self.month_stats = {"hits": 0, "misses": 0}
+        # user_id -> {sent, received, friends, requests, posts}, updated as data changes
+        self._stats = {}
+        # image path -> number of posts and profile pictures pointing at it
+        self._image_refs = Counter()
+        # Friend graph + recent moods for recommend_friends; None until needed or after a reload
+        self._recommender = None
+        # user_id -> (expires_at, k, [recommended user ids])
+        self._recommendations = {}
+        self.recommend_stats = {"hits": 0, "misses": 0, "precomputed": 0, "invalidated": 0}
 
         self.users_path = user_path
         self.chat_path = chat_path
         self.post_path = post_path
         self.mood_path = mood_path
 
+        # storage: "json" (default), "sqlite", or a storage object; see manager/storage.py
+        if storage is None or isinstance(storage, str):
+            storage = open_storage(storage, user_path, chat_path, post_path, mood_path, db_path,
+                                   chat_fsync, compact_every)
+        self.storage = storage
+
+        # One Manager is shared by every session (see gui/login/login_page.py)
+        self.lock = RWLock()
+        # Per-user / per-conversation versions that pages watch instead of polling on a timer
+        self.changes = ChangeBus()
+
         self.next_user_id = 1
         self.next_chat_id = 1
         self.next_post_id = 1
 
+        # On-disk signature of each collection as of our last read or write
+        self._loaded_sigs = {}
+        self.reload_stats = {"performed": 0, "skipped": 0}
+
+        # Collections changed since the last flush, plus write counters
+        self._dirty = set()
+        self.save_stats = {"saves": 0, "files_written": 0, "bytes_written": 0,
+                           "last_files": 0, "last_bytes": 0}
+
         self.load_data()
 
     # ------------------- Load Data ------------------- #
-    def load_data(self):
-        self.users, self.next_user_id = self._load_json(self.users_path, "users", User, "next_user_id")
-        self.chat, self.next_chat_id = self._load_json(self.chat_path, "chats", Chat, "next_chat_id")
-        self.posts, self.next_post_id = self._load_json(self.post_path, "posts", Post, "next_post_id")
-        self.moods, _ = self._load_json(self.mood_path, "moods", Mood)
-
-    def _load_json(self, path, key, cls, next_id_key=None):
-        data_list = []
-        next_id = 1
-        chat_thread_lock = threading.Lock()
+    @write_locked
+    def load_data(self, force=False):
+        # Re-parse only the collections that changed on disk since we last read or wrote them
+        for key in COLLECTIONS:
+            old_sig = None if force else self._loaded_sigs.get(key)
+            status, records, next_id, sig = self.storage.load_changed(key, old_sig)
+            self._loaded_sigs[key] = sig
+            if status == "unchanged":
+                self.reload_stats["skipped"] += 1
+                continue
+
+            self.reload_stats["performed"] += 1
+            if status == "appended":
+                # Only new chat messages (or conversation tombstones) landed; skip chats we already hold
+                for record in records:
+                    if "drop" in record:
+                        for c in self.chat.remove_conversation(*record["drop"], before_chat_id=record["before"]):
+                            self._count_chat(c, -1)
+                        self.changes.bump(conversation_topic(*record["drop"]))
+                    elif record["chat_id"] >= self.next_chat_id:
+                        c = Chat.from_dict(record)
+                        self.chat.append(c)
+                        self._count_chat(c)
+                        self.next_chat_id = c.chat_id + 1
+                        self.changes.bump(conversation_topic(c.sender, c.receiver))
+                continue
+
+            objects = self._to_objects(key, records)
+
+            if key == "users":
+                self.users, self.next_user_id = objects, next_id
+                self._index_users()
+            elif key == "chats":
+                self.chat, self.next_chat_id = make_chat_store(self.chat_store, objects), next_id
+            elif key == "posts":
+                self.posts, self.next_post_id = objects, next_id
+                self._index_posts()
+            elif key == "moods":
+                self.moods = objects
+                self._index_moods()
+                self._month_events.clear()
+                self._mood_stats.clear()
+            self._recount_stats(key, objects)
+            if key in ("users", "posts"):
+                self._recount_images()
+            if key in ("users", "moods"):
+                self._recommender = None
+                self._drop_recommendations()
+            # Another process rewrote a collection; we can't tell who it touched
+            self.changes.bump_all()
+
+    def _index_users(self):
+        self._users_by_id = {u.user_id: u for u in self.users}
+        self._users_by_name = {u.username: u for u in self.users}
+
+    def _index_moods(self):
+        self._moods_by_user = {m.user_id: m for m in self.moods}
+
+    def _index_posts(self):
+        self._posts_by_user = {}
+        for p in sorted(self.posts, key=self._post_order):
+            self._posts_by_user.setdefault(p.user_id, []).append(p)
+
+    @staticmethod
+    def _post_order(post):
+        # Post dates are "%d/%m/%Y" strings, so compare them as (year, month, day)
+        day, month, year = post.datetime.split("/")
+        return int(year), int(month), int(day), post.chat_id
+
+    # ------------------- User Stats ------------------- #
+    def _stats_for(self, user_id):
+        return self._stats.setdefault(user_id, dict.fromkeys(STAT_FIELDS, 0))
+
+    def _count_chat(self, chat, delta=1):
+        self._stats_for(chat.sender)["sent"] += delta
+        self._stats_for(chat.receiver)["received"] += delta
+
+    def _count_friends(self, user):
+        stats = self._stats_for(user.user_id)
+        stats["friends"] = len(user.friends)
+        stats["requests"] = len(user.friend_request)
+
+    def _recount_stats(self, key, objects):
+        # Full recount after a collection is (re)loaded; between reloads the counters are updated in place
+        if key == "users":
+            for u in objects:
+                self._count_friends(u)
+        elif key == "chats":
+            for stats in self._stats.values():
+                stats["sent"] = stats["received"] = 0
+            for c in objects:
+                self._count_chat(c)
+        elif key == "posts":
+            for stats in self._stats.values():
+                stats["posts"] = 0
+            for p in objects:
+                self._stats_for(p.user_id)["posts"] += 1
+
+    # ------------------- Image References ------------------- #
+    def _recount_images(self):
+        self._image_refs = Counter(p.image_path for p in self.posts if p.image_path)
+        self._image_refs.update(u.profile_pic for u in self.users if u.profile_pic)
+
+    def _set_profile_pic(self, user, path):
+        old = user.profile_pic
+        user.profile_pic = path
+        self._image_refs[path] += 1
+        if old:
+            self._image_refs[old] -= 1
+            if self._image_refs[old] <= 0:
+                del self._image_refs[old]
+                delete_image(old)
+
+    @write_locked
+    def collect_images(self, grace=3600):
+        # Sweeps stored images nothing points at (e.g. left behind by a crash); returns how many went
+        self.load_data()
+        return collect_garbage(set(+self._image_refs), grace)
+
+    @read_locked
+    def get_user_stats(self, user_id):
         try:
-            with chat_thread_lock:
-                with FileLock(path + ".lock"):
-                    with open(path, "r") as f:
-                        data = json.load(f)
-        except:
-            data = {}
-
-        if key in data:
-            if cls == User:
-                data_list = [
-                    User(u["user_id"], u["username"], u["password"], u["name"], u["gender"], u["bday"],
-                         u["contact_num"], u["profile_pic"], u["status"], u["last_active"], u["remark"],
-                         u["chat_ids"], u["friends"], u["friend_request"])
-                    for u in data[key]
-                ]
-            elif cls == Chat:
-                data_list = [
-                    Chat(c["chat_id"], c["sender"], c["receiver"], c["content"])
-                    for c in data[key]
-                ]
-            elif cls == Post:
-                data_list = [
-                    Post(p["chat_id"], p["user_id"], p["image_path"], p["datetime"])
-                    for p in data[key]
-                ]
-            elif cls == Mood:
-                data_list = [
-                    Mood(m["user_id"], m["moods"])
-                    for m in data[key]
-                ]
-
-        if next_id_key:
-            next_id = data.get(next_id_key, 1)
-
-        return data_list, next_id
+            stats = self._stats.get(int(user_id))
+        except (TypeError, ValueError):
+            stats = None
+        return dict(stats) if stats else dict.fromkeys(STAT_FIELDS, 0)
+
+    def _to_objects(self, key, records):
+        if key == "users":
+            return [User.from_dict(u) for u in records]
+        elif key == "chats":
+            return [Chat.from_dict(c) for c in records]
+        elif key == "posts":
+            return [Post.from_dict(p) for p in records]
+        elif key == "moods":
+            return [Mood.from_dict(m) for m in records]
+        return []
 
     # ------------------- Save Data ------------------- #
-    def save_data(self):
-        self._save_json(self.users_path, "users", self.users, "next_user_id", self.next_user_id)
-        self._save_json(self.chat_path, "chats", self.chat, "next_chat_id", self.next_chat_id)
-        self._save_json(self.post_path, "posts", self.posts, "next_post_id", self.next_post_id)
-        self._save_json(self.mood_path, "moods", self.moods)
-
-    def _save_json(self, path, key, obj_list, next_id_key=None, next_id_value=None):
-        chat_thread_lock = threading.Lock()
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        
-        data_to_save = {key: [o.__dict__ for o in obj_list]}
-        if next_id_key and next_id_value is not None:
-            data_to_save[next_id_key] = next_id_value
-
-        with chat_thread_lock:
-            with FileLock(path + ".lock"):
-                with open(path, "w") as f:
-                    json.dump(data_to_save, f, indent=4)
-                    print(f"Save {path}")
-
-    def save(self):
-        self.save_data()
+    def mark_dirty(self, *keys):
+        self._dirty.update(keys)
+
+    @write_locked
+    def save_data(self, *keys):
+        # Only rewrite the collections that changed; keys lets callers flag extra ones
+        self.mark_dirty(*keys)
+        files = 0
+        written = 0
+        for key in COLLECTIONS:
+            if key in self._dirty:
+                written += self._save_collection(key)
+                files += 1
+                self._loaded_sigs[key] = self.storage.signature(key)
+        self._dirty.clear()
+        self._record_save(files, written)
+        return written
+
+    def _record_save(self, files, written):
+        self.save_stats["saves"] += 1
+        self.save_stats["files_written"] += files
+        self.save_stats["bytes_written"] += written
+        self.save_stats["last_files"] = files
+        self.save_stats["last_bytes"] = written
+
+    def _save_collection(self, key):
+        if key == "users":
+            return self.storage.save("users", [u.to_dict() for u in self.users], self.next_user_id)
+        elif key == "chats":
+            return self.storage.save("chats", [c.to_dict() for c in self.chat], self.next_chat_id)
+        elif key == "posts":
+            return self.storage.save("posts", [p.to_dict() for p in self.posts], self.next_post_id)
+        elif key == "moods":
+            if self.storage.mood_format == "bin":
+                return self.storage.save("moods", [m.to_timeline() for m in self.moods])
+            return self.storage.save("moods", [m.to_dict() for m in self.moods])
+        return 0
+
+    def save(self, *keys):
+        return self.save_data(*keys)
 
     # ------------------- User Methods ------------------- #
+    @write_locked
     def add_user(self, username, password):
         user_id = self.next_user_id
-        if User.username_validation(username):
-            return None, User.username_validation(username)
+        if User.username_validation(self, username):
+            return None, User.username_validation(self, username)
         if User.password_validation(password):
             return None, User.password_validation(password)
 
         current_dt = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
         new_user = User.create_user_object(user_id, username, password, current_dt, [], [], [])
         self.users.append(new_user)
+        self._users_by_id[new_user.user_id] = new_user
+        self._count_friends(new_user)
+        self._recommender = None
+        self._users_by_name[new_user.username] = new_user
         self.next_user_id += 1
-        self.save_data()
+        self.save_data("users")
         return user_id, "[System] Successfully created user"
 
+    @write_locked
     def update_profile(self, user_id, new_password, new_name, new_bday, new_gender, new_contact_num, upload_file=None):
-        user = next((u for u in self.users if u.user_id == user_id), None)
+        user = self.return_user(user_id)
         if not user:
             return "User not found"
 
-        # Profile pic
+        # Profile pic: written in the background, and switched over once it's on disk
         if upload_file:
-            profile_dir = "profile_pics"
-            os.makedirs(profile_dir, exist_ok=True)
             file_ext = os.path.splitext(upload_file.name)[1] or ".png"
-            save_path = os.path.join(profile_dir, f"{user_id}{file_ext}")
-            counter = 1
-            while os.path.exists(save_path):
-                save_path = os.path.join(profile_dir, f"{user_id}_{counter}{file_ext}")
-                counter += 1
-            Image.open(upload_file).save(save_path)
-            user.profile_pic = save_path
+            save_path, future = store_upload(upload_file.getvalue(), file_ext)
+            if future:
+                future.add_done_callback(lambda f: self._profile_pic_done(user.user_id, save_path, f))
+            else:
+                self._set_profile_pic(user, save_path)
 
         user.password = new_password
         user.name = new_name
@@ -142,142 +309,367 @@ class Manager:
         user.gender = new_gender
         user.contact_num = new_contact_num
 
-        self.save_data()
+        self.save_data("users")
+        self.changes.bump(user_topic(user_id))
         return "Profile updated successfully"
 
+    @write_locked
+    def _profile_pic_done(self, user_id, save_path, future):
+        # Runs on an image worker thread
+        if future.exception():
+            print(f"Profile picture {save_path} failed: {future.exception()}")
+            return
+        user = self.return_user(user_id)
+        if user:
+            self._set_profile_pic(user, save_path)
+            self.save_data("users")
+            self.changes.bump(user_topic(user_id))
+
     # ------------------- Chat Methods ------------------- #
+    @write_locked
     def add_chat(self, sender, receiver, content):
-        chat_thread_lock = threading.Lock()
-        with chat_thread_lock:
-            chat_id = self.next_chat_id
-            new_chat = Chat(chat_id, sender, receiver, content)
-            self.chat.append(new_chat)
-            self.next_chat_id += 1
-            self.save_data()
-            return "sent"
-
+        # The storage picks the id under its chat lock; the message then comes back through
+        # the log tail, in id order with anything other processes sent meanwhile
+        _, written = self.storage.append_chat({"sender": sender, "receiver": receiver, "content": content})
+        self._record_save(1, written)
+        self.load_data()
+        return "sent"
 
     def get_chat_history(self, user_id, friend_id):
-        chat_thread_lock = threading.Lock()
-        
-        with chat_thread_lock:
-            self.load_data()
-            return [c for c in self.chat if
-                    (str(c.sender) == str(user_id) and str(c.receiver) == str(friend_id)) or
-                    (str(c.sender) == str(friend_id) and str(c.receiver) == str(user_id))]
-    
+        # Refresh first: load_data needs the write lock, which can't be taken while reading
+        self.load_data()
+        with self.lock.read():
+            if self.storage.indexed:
+                return self._to_objects("chats", self.storage.chat_history(user_id, friend_id))
+            return self.chat.conversation(user_id, friend_id)
+
+    def get_sent_count(self, user_id):
+        return self.get_user_stats(user_id)["sent"]
+
+    def get_chat_since(self, user_id, friend_id, after_chat_id):
+        # Only the messages newer than after_chat_id, for pages that already hold the rest
+        self.load_data()
+        with self.lock.read():
+            if self.storage.indexed:
+                return self._to_objects("chats", self.storage.chat_since(user_id, friend_id, after_chat_id))
+            return self.chat.since(user_id, friend_id, after_chat_id)
+
+    def get_chat_page(self, user_id, friend_id, before_id=None, limit=30):
+        # One page of a conversation ending just before before_id (the newest page when None), oldest first
+        self.load_data()
+        with self.lock.read():
+            if self.storage.indexed:
+                return self._to_objects("chats", self.storage.chat_page(user_id, friend_id, before_id, limit))
+            return self.chat.page(user_id, friend_id, before_id, limit)
+
     # ------------------- Friend Methods ------------------- #
+    @write_locked
     def add_friend(self, current_user, friend_uname):
-        friend = next((f for f in self.users if f.username == friend_uname), None)
+        friend = self.return_user_by_username(friend_uname)
         if not friend:
             return False
         current_dt = datetime.datetime.now().strftime("%d/%m/%Y")
         friend.friend_request.append([current_dt, current_user.user_id])
-        self.save_data()
+        self._count_friends(friend)
+        self._friend_graph_changed(current_user.user_id, friend.user_id, requested=True)
+        self.save_data("users")
+        self.changes.bump(user_topic(friend.user_id))
         return True
 
+    @write_locked
+    def reject_request(self, current_user, sender):
+        current_user.friend_request = [req for req in current_user.friend_request if req[1] != sender.user_id]
+        self._count_friends(current_user)
+        self._count_friends(sender)
+        self._friend_graph_changed(current_user.user_id, sender.user_id, requested=False)
+        self.save_data("users")
+        self.changes.bump(user_topic(current_user.user_id), user_topic(sender.user_id))
+
+    @write_locked
     def accept_request(self, current_user, sender):
         current_dt = datetime.datetime.now().strftime("%d/%m/%Y")
         current_user.friends.append([current_dt, sender.user_id])
         sender.friends.append([current_dt, current_user.user_id])
         current_user.friend_request = [req for req in current_user.friend_request if req[1] != sender.user_id]
-        self.save_data()
+        self._count_friends(current_user)
+        self._count_friends(sender)
+        self._friend_graph_changed(current_user.user_id, sender.user_id, befriended=True, requested=False)
+        self.save_data("users")
+        self.changes.bump(user_topic(current_user.user_id), user_topic(sender.user_id))
 
+    @write_locked
     def unfriend(self, current_user, target_user_id):
         current_user.friends = [f for f in current_user.friends if f[1] != target_user_id]
-        target_user = next((u for u in self.users if u.user_id == target_user_id), None)
+        target_user = self.return_user(target_user_id)
         if target_user:
             target_user.friends = [f for f in target_user.friends if f[1] != current_user.user_id]
 
-        chats_to_remove = [c for c in self.chat if (c.sender == current_user.user_id and c.receiver == target_user_id) or
-                                                (c.sender == target_user_id and c.receiver == current_user.user_id)]
-        for c in chats_to_remove:
-            self.chat.remove(c)
-
-        self.save_data()
+        # Drop the conversation through the chat index and log a tombstone rather than rewriting every chat
+        removed = self.chat.remove_conversation(current_user.user_id, target_user_id, before_chat_id=self.next_chat_id)
+        removed_ids = {c.chat_id for c in removed}
+        for c in removed:
+            self._count_chat(c, -1)
+        for user in (current_user, target_user):
+            if user and removed_ids:
+                user.chat_ids = [i for i in user.chat_ids if i not in removed_ids]
+            if user:
+                self._count_friends(user)
+        self._friend_graph_changed(current_user.user_id, target_user.user_id if target_user else target_user_id, befriended=False)
+
+        self.save_data("users")
+        self._record_save(1, self.storage.delete_conversation(current_user.user_id, target_user_id, self.next_chat_id))
+        self.changes.bump(user_topic(current_user.user_id), user_topic(target_user_id),
+                          conversation_topic(current_user.user_id, target_user_id))
         return True
     
-    def recommend_friends(self, user_id):
-        current_user = self.return_user(user_id)
-        except_current = [user for user in self.users if user.user_id == user_id and user_id not in current_user.friends]
-        recommendations = random.sample(except_current, min(3, len(except_current)))
-        return recommendations
+    @read_locked
+    def recommend_friends(self, user_id, k=3):
+        # Served from the per-user cache until it expires or the user's two-hop neighbourhood changes
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return []
+        cached = self._recommendations.get(user_id)
+        if cached and cached[0] > time.monotonic() and cached[1] >= k:
+            self.recommend_stats["hits"] += 1
+            ids = cached[2][:k]
+        else:
+            self.recommend_stats["misses"] += 1
+            ids = self._compute_recommendations(user_id, k)
+        return [self.return_user(uid) for uid in ids]
+
+    # ------------------- Recommendation Cache ------------------- #
+    def _compute_recommendations(self, user_id, k):
+        # The snapshot is built on first use after a reload, and again each new day
+        recommender = self._recommender
+        if recommender is None or recommender.today != datetime.date.today():
+            recommender = self._recommender = Recommender(self.users, self.moods)
+        ids = recommender.recommend(user_id, k)
+        self._recommendations[user_id] = (time.monotonic() + RECOMMEND_TTL, k, ids)
+        return ids
+
+    def _friend_graph_changed(self, user_id, other_id, befriended=None, requested=None):
+        # Patch the snapshot in place, then drop the cached picks of everyone whose
+        # scores can move: both users, and for a friendship change their friends too
+        # (their mutual-friend count with the other user changed)
+        if self._recommender is not None and not self._recommender.update(user_id, other_id, befriended, requested):
+            self._recommender = None
+        affected = {user_id, other_id}
+        if befriended is not None:
+            for uid in (user_id, other_id):
+                user = self.return_user(uid)
+                if user:
+                    affected.update(f[1] for f in user.friends)
+        self._drop_recommendations(affected)
+
+    def _drop_recommendations(self, user_ids=None):
+        if user_ids is None:
+            self.recommend_stats["invalidated"] += len(self._recommendations)
+            self._recommendations.clear()
+            return
+        for uid in user_ids:
+            if self._recommendations.pop(uid, None) is not None:
+                self.recommend_stats["invalidated"] += 1
+
+    def precompute_recommendations(self, k=3):
+        # Fills the cache for online users whose entry is missing or expired; returns how many were computed
+        with self.lock.read():
+            active = [u.user_id for u in self.users if u.status == "online"]
+        computed = 0
+        for uid in active:
+            # One short read lock per user so writers aren't held up for the whole pass
+            with self.lock.read():
+                cached = self._recommendations.get(uid)
+                if cached and cached[0] > time.monotonic() and cached[1] >= k:
+                    continue
+                self._compute_recommendations(uid, k)
+                self.recommend_stats["precomputed"] += 1
+                computed += 1
+        return computed
+
+    def start_recommendation_worker(self, interval=60, k=3):
+        # Optional daemon thread that runs precompute_recommendations every interval seconds
+        def run():
+            while True:
+                self.precompute_recommendations(k)
+                time.sleep(interval)
+        worker = threading.Thread(target=run, daemon=True, name="echolink-recommendations")
+        worker.start()
+        return worker
 
 
     # ------------------- Post Methods ------------------- #
+    @write_locked
     def add_post(self, user_id, post_file):
-        post_dir = "user_posts"
-        os.makedirs(post_dir, exist_ok=True)
-
+        # The post is recorded as "processing" right away; the image is written in the background.
+        # An image that's already stored is reused as is.
         next_id = self.next_post_id
         file_ext = os.path.splitext(post_file.name)[1] or ".png"
-        save_path = os.path.join(post_dir, f"{user_id}_post{next_id}{file_ext}")
-        counter = 1
-        while os.path.exists(save_path):
-            save_path = os.path.join(post_dir, f"{user_id}_{counter}{file_ext}")
-            counter += 1
-        Image.open(post_file).save(save_path)
-
-        new_post = Post(next_id, user_id, save_path, datetime.datetime.now().strftime("%d/%m/%Y"))
+        save_path, future = store_upload(post_file.getvalue(), file_ext)
+
+        status = "processing" if future else "ready"
+        new_post = Post(next_id, user_id, save_path, datetime.datetime.now().strftime("%d/%m/%Y"), status)
         self.posts.append(new_post)
+        self._image_refs[save_path] += 1
+        bisect.insort(self._posts_by_user.setdefault(new_post.user_id, []), new_post, key=self._post_order)
+        self._stats_for(new_post.user_id)["posts"] += 1
         self.next_post_id += 1
-        self.save_data()
+        self.save_data("posts")
+
+        if future:
+            future.add_done_callback(lambda f: self._post_image_done(user_id, next_id, f))
         return True
 
+    @write_locked
+    def _post_image_done(self, user_id, post_id, future):
+        # Runs on an image worker thread. Look the post up again: posts may have been reloaded meanwhile
+        post = next((p for p in self._posts_by_user.get(user_id, []) if p.chat_id == post_id), None)
+        if post is None:
+            return
+        if future.exception():
+            print(f"Post image {post.image_path} failed: {future.exception()}")
+            post.status = "failed"
+        else:
+            post.status = "ready"
+        self.save_data("posts")
+        self.changes.bump(user_topic(user_id))
+
+    @read_locked
     def get_post(self, user_id):
-        return [p.image_path for p in self.posts if p.user_id == user_id]
+        if self.storage.indexed:
+            return [p["image_path"] for p in self.storage.posts_for(user_id) if p["status"] == "ready"]
+        return [p.image_path for p in self._posts_by_user.get(user_id, []) if p.status == "ready"]
+
+    @read_locked
+    def get_posts(self, user_id, offset=0, limit=9):
+        # Newest first: skip offset posts, then return up to limit
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return []
+        if self.storage.indexed:
+            return self._to_objects("posts", self.storage.posts_page(user_id, offset, limit))
+        posts = self._posts_by_user.get(user_id, [])
+        end = max(0, len(posts) - offset)
+        return posts[max(0, end - limit):end][::-1]
 
     # ------------------- Mood Methods ------------------- #
     def get_user_moods(self, user_id):
-        mood_obj = next((m for m in self.moods if m.user_id == user_id), None)
-        if not mood_obj:
-            mood_obj = Mood(user_id, [])
-            self.moods.append(mood_obj)
-            self.save_data()
+        with self.lock.read():
+            mood_obj = self._moods_by_user.get(user_id)
+        if mood_obj:
+            return mood_obj
+
+        with self.lock.write():
+            # Re-check: another session may have created it between the two locks
+            mood_obj = self._moods_by_user.get(user_id)
+            if not mood_obj:
+                mood_obj = self._moods_by_user[user_id] = Mood(user_id, [])
+                self.moods.append(mood_obj)
+                self.save_data("moods")
         return mood_obj
 
+    @read_locked
+    def get_mood(self, user_id, date=None):
+        # Mood user_id logged on date (default today), or None; never creates a record
+        mood_obj = self._moods_by_user.get(user_id)
+        return mood_obj.get(date or datetime.date.today()) if mood_obj else None
+
+    @write_locked
     def set_daily_mood(self, user_id, mood):
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        today = datetime.date.today().isoformat()
         mood_obj = self.get_user_moods(user_id)
-        today_entry = next((m for m in mood_obj.moods if m["date"] == today), None)
-        if today_entry:
-            today_entry["mood"] = mood
-        else:
-            mood_obj.moods.append({"date": today, "mood": mood})
-        self.save_data()
+        mood_obj.set(today, mood)
+        self._mood_versions[mood_obj.user_id] = self._mood_versions.get(mood_obj.user_id, 0) + 1
+        if self._recommender is not None:
+            self._recommender.set_mood(mood_obj.user_id, today, mood)
+        self._drop_recommendations([mood_obj.user_id])
+        self.save_data("moods")
+        self.changes.bump(user_topic(user_id))
         return True
 
     def get_last_n_days_moods(self, user_id, n):
-        moods = self.get_user_moods(user_id).moods
-        moods_sorted = sorted(moods, key=lambda x: datetime.datetime.strptime(x["date"], "%Y-%m-%d"), reverse=True)
-        latest_n = moods_sorted[:n]
-        today = datetime.datetime.now().date()
-        dates_needed = [(today - datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n)]
-        mood_dict = {m["date"]: m["mood"] for m in latest_n}
-        return [{"date": d, "mood": mood_dict.get(d)} for d in sorted(dates_needed, reverse=True)]
+        # One entry per day for the last n days, newest first; mood is None on days without a log
+        if n <= 0:
+            return []
+        mood_obj = self.get_user_moods(user_id)
+        today = datetime.date.today()
+        codes = mood_obj.codes(today - datetime.timedelta(days=n - 1), today)
+        return [{"date": (today - datetime.timedelta(days=i)).isoformat(), "mood": MOODS[code - 1] if code else None}
+                for i, code in enumerate(reversed(codes))]
+
+    @read_locked
+    def get_month_events(self, user_id, year=None, month=None):
+        # streamlit-calendar events, one per day of the month (current month by default).
+        # Built from one timeline slice and reused until the user's moods change; don't mutate the result.
+        today = datetime.date.today()
+        year, month = year or today.year, month or today.month
+        version = self._mood_versions.get(user_id, 0)
+        cached = self._month_events.get((user_id, year, month))
+        if cached and cached[0] == version:
+            self.month_stats["hits"] += 1
+            return cached[1]
+        self.month_stats["misses"] += 1
+
+        mood_obj = self._moods_by_user.get(user_id) or Mood(user_id, [])
+        first = datetime.date(year, month, 1)
+        codes = mood_obj.codes(first, datetime.date(year, month, cal.monthrange(year, month)[1]))
+        events = []
+        for i, code in enumerate(codes):
+            day = (first + datetime.timedelta(days=i)).isoformat()
+            events.append({"title": CALENDAR_EMOJIS[code], "start": day, "end": day})
+        self._month_events[(user_id, year, month)] = (version, events)
+        return events
+
+    @read_locked
+    def get_mood_stats(self, user_id):
+        # Scores, streaks and trends over the last MOOD_STAT_DAYS days (see manager/mood_stats.py),
+        # reused until the user's moods change or the day rolls over
+        key = (self._mood_versions.get(user_id, 0), datetime.date.today())
+        cached = self._mood_stats.get(user_id)
+        if cached and cached[0] == key:
+            return cached[1]
+        stats = user_mood_stats(self._moods_by_user.get(user_id) or Mood(user_id, []))
+        self._mood_stats[user_id] = (key, stats)
+        return stats
+
+    @read_locked
+    def all_mood_stats(self, days=MOOD_STAT_DAYS):
+        # The same statistics for every user in one vectorized pass: (user ids, mood_stats arrays)
+        return [m.user_id for m in self.moods], mood_stats(mood_matrix(self.moods, days=days))
 
     def get_monthly_moods_df(self, user_id):
-        moods_obj = self.get_user_moods(user_id)
-        moods = moods_obj.moods if moods_obj else []
-        today = datetime.date.today()
-        num_days = cal.monthrange(today.year, today.month)[1]
-        all_dates = [datetime.date(today.year, today.month, d) for d in range(1, num_days + 1)]
-        df = pd.DataFrame({"date": all_dates})
-        mood_df = pd.DataFrame(moods) if moods else pd.DataFrame(columns=["date", "mood"])
-        if not mood_df.empty:
-            mood_df["date"] = pd.to_datetime(mood_df["date"]).dt.date
-
-        df = df.merge(mood_df, on="date", how="left").fillna({"mood": "unknown"})
-        mood_emojis = {"happy": "😊", "sad": "😢", "angry": "😡", "neutral": "😐", "excited": "🤩", "tired": "😴"}
-        df["mood"] = df["mood"].map(mood_emojis).fillna("❓")
-        return df
+        # DataFrame view of get_month_events (date, mood emoji); pandas is only needed here
+        import pandas as pd
+        events = self.get_month_events(user_id)
+        return pd.DataFrame({"date": [datetime.date.fromisoformat(e["start"]) for e in events],
+                             "mood": [e["title"] for e in events]})
 
     # ------------------- Remark ------------------- #
+    @write_locked
     def add_remark(self, user_id, remark):
-        user = next((u for u in self.users if u.user_id == user_id), None)
+        user = self.return_user(user_id)
         if user:
             user.remark = remark
-            self.save_data()
+            self.save_data("users")
+            self.changes.bump(user_topic(user_id))
+
+    @write_locked
+    def set_status(self, user_id, status):
+        user = self.return_user(user_id)
+        if user:
+            user.status = status
+            self.save_data("users")
+            self.changes.bump(user_topic(user_id))
 
+    @read_locked
     def return_user(self, user_id):
-        return next((u for u in self.users if u.user_id == user_id), None)
\ No newline at end of file
+        # Session state may hold the id as a string
+        try:
+            return self._users_by_id.get(int(user_id))
+        except (TypeError, ValueError):
+            return None
+
+    @read_locked
+    def return_user_by_username(self, username):
+        return self._users_by_name.get(username)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import struct
+from app.mood import Mood
+
+# data/mood.bin, little-endian:
+#   header  "EMOD", version (u16), user count (u32)
+#   users   user_id (i64), start day since 1970-01-01 (i32), days (u32), then one mood code per day
+MAGIC = b"EMOD"
+VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_USER = struct.Struct("<qiI")
+
+
+def is_binary(path):
+    return os.path.splitext(path)[1] == ".bin"
+
+
+def encode(records):
+    # records in timeline form: {"user_id", "start", "timeline"}
+    parts = [_HEADER.pack(MAGIC, VERSION, len(records))]
+    for r in records:
+        parts.append(_USER.pack(r["user_id"], r["start"], len(r["timeline"])))
+        parts.append(bytes(r["timeline"]))
+    return b"".join(parts)
+
+
+def decode(payload):
+    if not payload:
+        return []
+    magic, version, count = _HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} mood file")
+    records = []
+    offset = _HEADER.size
+    for _ in range(count):
+        user_id, start, days = _USER.unpack_from(payload, offset)
+        offset += _USER.size
+        records.append({"user_id": user_id, "start": start, "timeline": payload[offset:offset + days]})
+        offset += days
+    return records
+
+
+def as_timelines(records):
+    # Either record form -> timeline form
+    return [r if "timeline" in r else Mood.from_dict(r).to_timeline() for r in records]
+
+
+def as_lists(records):
+    # Either record form -> the {"user_id", "moods": [{"date", "mood"}]} form of data/mood.json
+    return [Mood.from_dict(r).to_dict() if "timeline" in r else r for r in records]
+
+
+def convert(src, dst):
+    # Rewrites a mood file in the other format, chosen by extension (.json or .bin)
+    with open(src, "rb") as f:
+        payload = f.read()
+    records = decode(payload) if is_binary(src) else json.loads(payload).get("moods", [])
+    if is_binary(dst):
+        out = encode(as_timelines(records))
+    else:
+        out = json.dumps({"moods": as_lists(records)}, indent=4).encode("utf-8")
+    with open(dst, "wb") as f:
+        f.write(out)
+    return len(payload), len(out)
+
+
+if __name__ == "__main__":
+    # python -m manager.mood_file data/mood.json data/mood.bin
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m manager.mood_file SRC DST")
+    before, after = convert(sys.argv[1], sys.argv[2])
+    print(f"{sys.argv[1]} ({before} bytes) -> {sys.argv[2]} ({after} bytes)")
@@ -0,0 +1,119 @@
+import datetime
+import numpy as np
+from app.mood import MOODS
+
+# Mood score of each mood, 0 (angry) to 5 (happy)
+MOOD_SCORES = {"happy": 5, "excited": 4, "neutral": 3, "tired": 2, "sad": 1, "angry": 0}
+# Indexed by mood code; code 0 (nothing logged) scores 0 and is left out by the logged mask
+_SCORE_BY_CODE = np.array([0] + [MOOD_SCORES[m] for m in MOODS], dtype=np.uint8)
+# The same as a bytes.translate table, which maps a whole matrix faster than a numpy gather
+_SCORE_TABLE = bytes(_SCORE_BY_CODE.tolist()) + bytes(256 - len(_SCORE_BY_CODE))
+# Window lengths (days) that get a mean score and a coverage figure
+WINDOWS = (3, 7, 10, 20, 30)
+ROLLING_DAYS = 7
+DAYS = 90
+
+
+def mood_matrix(moods, last=None, days=DAYS):
+    # users x days mood codes (uint8, 0 where nothing was logged) for the days days ending on last,
+    # one row per Mood in moods; column days - 1 is last (default today)
+    last = last or datetime.date.today()
+    first = last - datetime.timedelta(days=days - 1)
+    payload = b"".join(m.codes(first, last) for m in moods)
+    return np.frombuffer(payload, dtype=np.uint8).reshape(len(moods), days)
+
+
+def _day_major(codes, block=1024):
+    # days x users copy of a users x days matrix, transposed a block of users at a time to stay in cache
+    n, days = codes.shape
+    out = np.empty((days, n), dtype=np.uint8)
+    for i in range(0, n, block):
+        out[:, i:i + block] = codes[i:i + block].T
+    return out
+
+
+def _mean(sums, counts):
+    # 0 / 0 gives NaN where nothing was logged
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.divide(sums, counts, dtype=np.float32)
+
+
+def mood_stats(codes, windows=WINDOWS, rolling_days=ROLLING_DAYS):
+    # Every statistic for every row of a mood_matrix in one pass. Per user:
+    #   mean[w] / coverage[w]   mean score and share of days logged over the last w days
+    #   rolling                 mean score of the rolling_days days ending on each day (users x days)
+    #   streak / longest_streak consecutive logged days ending on the last day / anywhere in the matrix
+    #   volatility              standard deviation of the logged scores
+    #   wow_delta               mean score of the last 7 days minus the 7 before
+    codes = np.asarray(codes, dtype=np.uint8)
+    n, days = codes.shape
+    # Work day by day over contiguous rows of users: numpy's accumulate along a row is
+    # scalar code, while adding whole rows is vectorized
+    by_day = _day_major(codes)
+    logged = by_day > 0
+    scores = np.frombuffer(by_day.tobytes().translate(_SCORE_TABLE), dtype=np.uint8).reshape(days, n)
+
+    # Prefix sums with a leading zero row: any window sum is two lookups.
+    # int16 holds them for up to 6553 days (5 points a day).
+    score_sums = np.zeros((days + 1, n), dtype=np.int16)
+    log_counts = np.zeros((days + 1, n), dtype=np.int16)
+    run = np.zeros(n, dtype=np.int16)
+    longest = np.zeros(n, dtype=np.int16)
+    for d in range(days):
+        np.add(score_sums[d], scores[d], out=score_sums[d + 1])
+        np.add(log_counts[d], logged[d], out=log_counts[d + 1])
+        # Consecutive logged days ending on day d
+        run += 1
+        run *= logged[d]
+        np.maximum(longest, run, out=longest)
+
+    def window(w, end=days):
+        end = max(end, 0)
+        start = max(end - w, 0)
+        return score_sums[end] - score_sums[start], log_counts[end] - log_counts[start]
+
+    mean, coverage = {}, {}
+    for w in windows:
+        sums, counts = window(w)
+        mean[w] = _mean(sums, counts)
+        coverage[w] = (counts / min(w, days)).astype(np.float32)
+
+    # Day t sums days t - rolling_days + 1 .. t; the first days just sum from day 0
+    rolling_sums, rolling_counts = score_sums[1:].copy(), log_counts[1:].copy()
+    if days > rolling_days:
+        rolling_sums[rolling_days:] -= score_sums[1:days - rolling_days + 1]
+        rolling_counts[rolling_days:] -= log_counts[1:days - rolling_days + 1]
+    rolling = _mean(rolling_sums, rolling_counts).T
+
+    total, count = score_sums[-1], log_counts[-1]
+    square_sums = (scores * scores).sum(axis=0, dtype=np.int32)  # at most 25 a day, fits uint8
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = square_sums / count - (total / count) ** 2
+    volatility = np.where(count > 1, np.sqrt(np.maximum(variance, 0)), np.nan).astype(np.float32)
+
+    return {
+        "mean": mean,
+        "coverage": coverage,
+        "rolling": rolling,
+        "streak": run,
+        "longest_streak": longest,
+        "volatility": volatility,
+        "wow_delta": _mean(*window(7)) - _mean(*window(7, days - 7)),
+    }
+
+
+def user_mood_stats(mood, last=None, days=DAYS):
+    # mood_stats for one Mood, as plain Python values (None for NaN)
+    def value(x):
+        x = x.item()
+        return None if isinstance(x, float) and np.isnan(x) else x
+    stats = mood_stats(mood_matrix([mood], last, days))
+    return {
+        "mean": {w: value(a[0]) for w, a in stats["mean"].items()},
+        "coverage": {w: value(a[0]) for w, a in stats["coverage"].items()},
+        "rolling": [value(x) for x in stats["rolling"][0]],
+        "streak": value(stats["streak"][0]),
+        "longest_streak": value(stats["longest_streak"][0]),
+        "volatility": value(stats["volatility"][0]),
+        "wow_delta": value(stats["wow_delta"][0]),
+    }
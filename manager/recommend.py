@@ -0,0 +1,156 @@
+import datetime
+import numpy as np
+from app.mood import MOOD_CODES
+
+# README "Recommended Friends Algorithm":
+#   score = mutual_friends_count + mood_similarity_count
+# where mood similarity counts the last MOOD_DAYS days on which both users logged the same mood.
+MOOD_DAYS = 5
+# Edge edits absorbed by a snapshot before it asks to be rebuilt
+MAX_OVERLAY_EDGES = 10_000
+
+
+def _symmetric_csr(n, src, dst):
+    # Compressed sparse rows of an undirected graph, built with numpy alone.
+    # Edges (src[i], dst[i]) may repeat or only be listed from one side.
+    rows = np.concatenate((src, dst))
+    cols = np.concatenate((dst, src))
+    # One int64 per edge, so sorting orders by row, then column, and duplicates end up adjacent
+    keys = np.sort((rows * n + cols)[rows != cols])
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+    return indptr, keys % n
+
+
+class Recommender:
+    # Snapshot of the friend graph and of everyone's moods for the last MOOD_DAYS days.
+    # Rows are positions in users; user ids are mapped to rows once, here.
+    # Friend/request edits after the build go into small per-row overlays
+    # (added / removed neighbours) instead of rebuilding the CSR arrays.
+    def __init__(self, users, moods, today=None):
+        self.today = today or datetime.date.today()
+        self.user_ids = np.array([u.user_id for u in users], dtype=np.int64)
+        self._rows = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        n = len(self.user_ids)
+
+        rows = self._rows
+        self.friends = _symmetric_csr(n, *self._edges([u.friends for u in users]))
+        # Pending requests in either direction
+        self.requests = _symmetric_csr(n, *self._edges([u.friend_request for u in users]))
+        # graph -> {row: set of rows} for edges added / removed since the build
+        self._added = {"friends": {}, "requests": {}}
+        self._removed = {"friends": {}, "requests": {}}
+        self._overlay_edges = 0
+
+        # users x days mood codes, 0 where nothing was logged; column MOOD_DAYS - 1 is today
+        self.moods = np.zeros((n, MOOD_DAYS), dtype=np.int8)
+        first = self.today - datetime.timedelta(days=MOOD_DAYS - 1)
+        for m in moods:
+            row = rows.get(m.user_id)
+            if row is None:
+                continue
+            self.moods[row] = np.frombuffer(m.codes(first, self.today), dtype=np.int8)
+
+    def _edges(self, lists):
+        # lists[row] holds [date, user_id] entries; returns (src rows, dst rows), dropping unknown ids
+        counts = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+        dst_ids = np.fromiter((e[1] for entries in lists for e in entries), dtype=np.int64, count=int(counts.sum()))
+        src = np.repeat(np.arange(len(lists), dtype=np.int64), counts)
+        order = np.argsort(self.user_ids)
+        sorted_ids = self.user_ids[order]
+        pos = np.searchsorted(sorted_ids, dst_ids).clip(max=max(len(sorted_ids) - 1, 0))
+        known = sorted_ids[pos] == dst_ids if len(sorted_ids) else np.zeros(len(dst_ids), dtype=bool)
+        return src[known], order[pos[known]]
+
+    # ------------------- Updates ------------------- #
+    def update(self, user_id, other_id, befriended=None, requested=None):
+        # True/False adds/removes the friendship or pending request between the two users,
+        # None leaves it alone. Returns False when the snapshot should be rebuilt instead.
+        a, b = self._rows.get(user_id), self._rows.get(other_id)
+        if a is None or b is None or self._overlay_edges >= MAX_OVERLAY_EDGES:
+            return False
+        for graph, change in (("friends", befriended), ("requests", requested)):
+            if change is not None:
+                self._set_edge(graph, a, b, change)
+                self._set_edge(graph, b, a, change)
+        return True
+
+    def _set_edge(self, graph, a, b, present):
+        added, removed = self._added[graph], self._removed[graph]
+        indptr, indices = getattr(self, graph)
+        in_base = b in indices[indptr[a]:indptr[a + 1]]
+        if present:
+            removed.get(a, set()).discard(b)
+            if not in_base:
+                added.setdefault(a, set()).add(b)
+        else:
+            added.get(a, set()).discard(b)
+            if in_base:
+                removed.setdefault(a, set()).add(b)
+        self._overlay_edges += 1
+
+    def set_mood(self, user_id, date, mood):
+        row = self._rows.get(user_id)
+        day = (datetime.date.fromisoformat(date) - self.today).days + MOOD_DAYS - 1
+        if row is not None and 0 <= day < MOOD_DAYS:
+            self.moods[row, day] = MOOD_CODES.get(mood, 0)
+
+    # ------------------- Queries ------------------- #
+    def _neighbors(self, graph, row):
+        indptr, indices = getattr(self, graph)
+        base = indices[indptr[row]:indptr[row + 1]]
+        added, removed = self._added[graph].get(row), self._removed[graph].get(row)
+        if not added and not removed:
+            return base
+        return np.array(sorted(set(base.tolist()) - (removed or set()) | (added or set())), dtype=np.int64)
+
+    def mutual_counts(self, row):
+        # Friends-of-friends histogram: every friend's adjacency slice gathered in one go
+        indptr, indices = self.friends
+        friends = self._neighbors("friends", row)
+        starts = indptr[friends]
+        lengths = indptr[friends + 1] - starts
+        gather = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        counts = np.bincount(indices[gather], minlength=len(self.user_ids))
+        # The gather read the CSR as built; apply the overlay edits of those friends
+        if self._overlay_edges:
+            added, removed = self._added["friends"], self._removed["friends"]
+            for f in (added.keys() | removed.keys()).intersection(friends.tolist()):
+                for other in removed.get(f, ()):
+                    counts[other] -= 1
+                for other in added.get(f, ()):
+                    counts[other] += 1
+        return counts
+
+    def mood_similarity(self, row):
+        mine = self.moods[row]
+        days = np.flatnonzero(mine)
+        if not len(days):
+            return np.zeros(len(self.user_ids), dtype=np.int64)
+        return (self.moods[:, days] == mine[days]).sum(axis=1)
+
+    def scores(self, row):
+        scores = self.mutual_counts(row) + self.mood_similarity(row)
+        # Never suggest yourself, current friends, or anyone with a request pending either way
+        scores[row] = -1
+        scores[self._neighbors("friends", row)] = -1
+        scores[self._neighbors("requests", row)] = -1
+        return scores
+
+    def recommend(self, user_id, k=3):
+        # Up to k user ids, best score first (ties in users order)
+        try:
+            row = self._rows.get(int(user_id))
+        except (TypeError, ValueError):
+            row = None
+        if row is None or k <= 0:
+            return []
+        scores = self.scores(row)
+        n = len(scores)
+        k = min(k, n)
+        # Higher score first, then earlier row, folded into one key so argpartition breaks ties the same way
+        key = scores * n - np.arange(n)
+        top = np.argpartition(-key, k - 1)[:k]
+        top = top[np.argsort(-key[top])]
+        return self.user_ids[top[scores[top] >= 0]].tolist()
@@ -0,0 +1,537 @@
+import os
+import json
+import sqlite3
+import threading
+from filelock import FileLock
+from manager import mood_file
+
+COLLECTIONS = ("users", "chats", "posts", "moods")
+NEXT_ID_KEYS = {"users": "next_user_id", "chats": "next_chat_id", "posts": "next_post_id", "moods": None}
+
+
+def open_storage(kind=None, user_path="data/user.json", chat_path="data/chat.json",
+                 post_path="data/post.json", mood_path="data/mood.json", db_path=None,
+                 chat_fsync="never", compact_every=500):
+    # kind falls back to $ECHOLINK_STORAGE, then to the JSON files
+    kind = kind or os.environ.get("ECHOLINK_STORAGE", "json")
+    # $ECHOLINK_MOOD_FORMAT=bin keeps moods in mood.bin (one byte per day) next to mood.json
+    if os.environ.get("ECHOLINK_MOOD_FORMAT") == "bin":
+        mood_path = os.path.splitext(mood_path)[0] + ".bin"
+    json_storage = JsonStorage(user_path, chat_path, post_path, mood_path, chat_fsync, compact_every)
+    if kind == "json":
+        return json_storage
+    elif kind == "sqlite":
+        db_path = db_path or os.environ.get("ECHOLINK_DB", "data/echolink.db")
+        return SqliteStorage(db_path, seed=json_storage)
+    raise ValueError(f"Unknown storage backend '{kind}'")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def _dump_json(key, records, next_id_key=None, next_id_value=None):
+    data_to_save = {key: records}
+    if next_id_key and next_id_value is not None:
+        data_to_save[next_id_key] = next_id_value
+    return json.dumps(data_to_save, indent=4).encode("utf-8")
+
+
+def _replay_chat_log(records, next_id, log_records):
+    # Log lines are either new chats or {"drop": [a, b], "before": id} conversation tombstones
+    for c in log_records:
+        if "drop" in c:
+            pair = set(c["drop"])
+            records = [r for r in records if r["chat_id"] >= c["before"] or {r["sender"], r["receiver"]} != pair]
+        elif c["chat_id"] >= next_id:
+            records.append(c)
+            next_id = c["chat_id"] + 1
+    return records, next_id
+
+
+def _read_bytes(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _parse_chat_log(data):
+    records = []
+    for line in data.splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break  # torn write at the tail of the log
+    return records
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(payload)
+        print(f"Save {path}")
+
+
+# ------------------- JSON Files ------------------- #
+class JsonStorage:
+    # One JSON file per collection; chats are a snapshot plus an append-only log
+    indexed = False
+
+    def __init__(self, user_path="data/user.json", chat_path="data/chat.json",
+                 post_path="data/post.json", mood_path="data/mood.json",
+                 chat_fsync="never", compact_every=500):
+        self.paths = {"users": user_path, "chats": chat_path, "posts": post_path, "moods": mood_path}
+        # "bin" when moods live in a mood.bin file; Manager then saves them in timeline form
+        self.mood_format = "bin" if mood_file.is_binary(mood_path) else "json"
+        self.chat_log_path = os.path.splitext(chat_path)[0] + ".log"
+
+        # Chat messages are appended to chat_log_path and folded into
+        # chat_path by a background compaction every compact_every records.
+        # chat_fsync: "always" fsyncs each send, "never" leaves it to the OS.
+        self.chat_fsync = chat_fsync
+        self.compact_every = compact_every
+        self._chat_log_records = 0
+        self._compacting = False
+        # (signature before, signature after, log bytes folded in) of our last compaction,
+        # so readers that were current before it get a tail instead of a full reload
+        self._compaction = None
+        # (chat file signature, next free chat id) as of the last time we looked under the lock
+        self._chat_next = (None, 1)
+
+    def _file_signature(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None, 0
+
+    def signature(self, key):
+        # Cheap stat-based fingerprint; chats also track the log length so appends can be tailed
+        sig = self._file_signature(self.paths[key])
+        if key == "chats":
+            sig += (self._file_signature(self.chat_log_path)[1],)
+        return sig
+
+    def load_changed(self, key, old_sig=None):
+        # Returns (status, records, next_id, sig); status is "unchanged", "appended" or "full"
+        path = self.paths[key]
+        with FileLock(path + ".lock"):
+            sig = self.signature(key)
+            if old_sig is not None and sig == old_sig:
+                return "unchanged", [], None, sig
+            if key == "chats" and old_sig is not None and sig[:2] == old_sig[:2] and sig[2] > old_sig[2]:
+                return "appended", self._read_chat_log(offset=old_sig[2]), None, sig
+            if key == "chats" and old_sig is not None and self._compaction:
+                before, after, folded = self._compaction
+                if sig[:2] == after[:2] and old_sig[:2] == before[:2] and old_sig[2] <= before[2]:
+                    # Only our own compaction rewrote the snapshot: hand back what the caller hadn't read yet
+                    records = _parse_chat_log(folded[old_sig[2]:]) + self._read_chat_log()
+                    return ("appended" if records else "unchanged"), records, None, sig
+            records, next_id = self._load_locked(key)
+        return "full", records, next_id, sig
+
+    def load(self, key):
+        with FileLock(self.paths[key] + ".lock"):
+            return self._load_locked(key)
+
+    def _load_locked(self, key):
+        path = self.paths[key]
+        if key == "moods" and self.mood_format == "bin":
+            return self._load_mood_bin(path), 1
+        data = _read_json(path)
+        # Snapshot and log are read under one lock so a compaction can't slip in between
+        log_records = self._read_chat_log() if key == "chats" else []
+
+        records = data.get(key, [])
+        next_id = data.get(NEXT_ID_KEYS[key], 1) if NEXT_ID_KEYS[key] else 1
+        records, next_id = _replay_chat_log(records, next_id, log_records)
+        if key == "chats":
+            self._chat_log_records = len(log_records)
+            self._chat_next = (self.signature("chats"), next_id)
+        return records, next_id
+
+    def _load_mood_bin(self, path):
+        payload = _read_bytes(path)
+        if payload:
+            return mood_file.decode(payload)
+        # First run in binary mode: start from the JSON file it replaces
+        return _read_json(os.path.splitext(path)[0] + ".json").get("moods", [])
+
+    def save(self, key, records, next_id=None):
+        path = self.paths[key]
+        if key == "moods" and self.mood_format == "bin":
+            payload = mood_file.encode(mood_file.as_timelines(records))
+        else:
+            payload = _dump_json(key, records, NEXT_ID_KEYS[key], next_id)
+        with FileLock(path + ".lock"):
+            _write_json(path, payload)
+            if key == "chats":
+                # A full chat rewrite replaces the snapshot and empties the log it absorbed
+                open(self.chat_log_path, "w").close()
+                self._chat_log_records = 0
+                self._chat_next = (self.signature("chats"), next_id or 1)
+        return len(payload)
+
+    # ------------------- Chat Log ------------------- #
+    def _read_chat_log(self, offset=0):
+        try:
+            with open(self.chat_log_path, "rb") as f:
+                f.seek(offset)
+                return _parse_chat_log(f.read())
+        except FileNotFoundError:
+            return []
+
+    def append_chat(self, record):
+        # record without its chat_id; the id is picked under the chat lock so two processes
+        # can't hand out the same one. Returns (chat_id, bytes written).
+        record = self._append_chat_log(record)
+        return record["chat_id"], record["bytes"]
+
+    def _sync_chat_next(self):
+        # Next free chat id on disk; call with the chat lock held. Usually nothing changed
+        # since our last write, otherwise only the new part of the log is read.
+        sig = self.signature("chats")
+        known_sig, next_id = self._chat_next
+        if known_sig == sig:
+            return next_id
+        if known_sig is not None and sig[:2] == known_sig[:2] and sig[2] > known_sig[2]:
+            records = self._read_chat_log(offset=known_sig[2])
+            next_id = max([next_id] + [r["chat_id"] + 1 for r in records if "chat_id" in r])
+            self._chat_next = (sig, next_id)
+            return next_id
+        return self._load_locked("chats")[1]
+
+    def delete_conversation(self, user_id, friend_id, before_chat_id):
+        # A tombstone in the log instead of rewriting the snapshot; compaction applies it
+        return self._append_chat_log({"drop": [user_id, friend_id], "before": before_chat_id})["bytes"]
+
+    def _append_chat_log(self, record):
+        # Returns {"chat_id": ..., "bytes": ...}; chat_id is None for tombstones
+        chat_path = self.paths["chats"]
+        os.makedirs(os.path.dirname(self.chat_log_path), exist_ok=True)
+        with FileLock(chat_path + ".lock"):
+            next_id = self._sync_chat_next()
+            chat_id = None
+            if "drop" not in record:
+                chat_id = next_id
+                record = {"chat_id": chat_id, **record}
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            with open(self.chat_log_path, "ab") as f:
+                f.write(line)
+                if self.chat_fsync == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._chat_log_records += 1
+            self._chat_next = (self.signature("chats"), next_id + 1 if chat_id else next_id)
+
+        if self._chat_log_records >= self.compact_every and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact_chat_log, daemon=True).start()
+        return {"chat_id": chat_id, "bytes": len(line)}
+
+    def compact_chat_log(self):
+        # Fold the on-disk log into the snapshot; works from disk so other writers' records are kept
+        chat_path = self.paths["chats"]
+        try:
+            with FileLock(chat_path + ".lock"):
+                before = self.signature("chats")
+                data = _read_json(chat_path)
+                folded = _read_bytes(self.chat_log_path)
+                log_records = _parse_chat_log(folded)
+                if not log_records:
+                    return 0
+
+                records, next_id = _replay_chat_log(data.get("chats", []), data.get("next_chat_id", 1), log_records)
+
+                payload = _dump_json("chats", records, "next_chat_id", next_id)
+                tmp_path = chat_path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, chat_path)
+                open(self.chat_log_path, "w").close()
+                self._chat_log_records = 0
+                self._compaction = (before, self.signature("chats"), folded)
+                self._chat_next = (self._compaction[1], next_id)
+                print(f"Compact {self.chat_log_path} ({len(log_records)} records)")
+            return len(log_records)
+        finally:
+            self._compacting = False
+
+
+# ------------------- SQLite ------------------- #
+USER_COLUMNS = ("user_id", "username", "password", "name", "gender", "bday", "contact_num", "profile_pic",
+                "status", "last_active", "remark", "chat_ids", "friends", "friend_request")
+USER_LIST_COLUMNS = ("chat_ids", "friends", "friend_request")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT, name TEXT, gender TEXT, bday TEXT, contact_num TEXT, profile_pic TEXT,
+    status TEXT, last_active TEXT, remark TEXT,
+    chat_ids TEXT, friends TEXT, friend_request TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    sender INTEGER NOT NULL,
+    receiver INTEGER NOT NULL,
+    content TEXT,
+    user_lo INTEGER NOT NULL,
+    user_hi INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chats_by_pair ON chats (user_lo, user_hi, chat_id);
+CREATE INDEX IF NOT EXISTS chats_by_sender ON chats (sender);
+CREATE TABLE IF NOT EXISTS posts (
+    post_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    image_path TEXT,
+    datetime TEXT,
+    status TEXT NOT NULL DEFAULT 'ready'
+);
+CREATE INDEX IF NOT EXISTS posts_by_user ON posts (user_id, post_id);
+CREATE TABLE IF NOT EXISTS moods (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    mood TEXT,
+    PRIMARY KEY (user_id, date)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+-- Unfriend deletions, so other processes can apply them without reloading every chat
+CREATE TABLE IF NOT EXISTS chat_drops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_a INTEGER NOT NULL,
+    user_b INTEGER NOT NULL,
+    before INTEGER NOT NULL
+);
+"""
+# Primary key columns of the tables save() diffs row by row
+ROW_KEYS = {"users": ("user_id",), "posts": ("post_id",), "moods": ("user_id", "date")}
+
+
+class SqliteStorage:
+    # One table per collection with indexes for the per-user / per-conversation reads
+    indexed = True
+    mood_format = "json"
+
+    def __init__(self, db_path="data/echolink.db", seed=None):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # key -> {primary key: row} as last read or written, so save() only touches rows that differ
+        self._rows = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+            is_new = self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0
+
+        # A fresh database is filled from the JSON files once
+        if is_new and seed is not None:
+            for key in COLLECTIONS:
+                records, next_id = seed.load(key)
+                self.save(key, records, next_id)
+
+    def _migrate(self):
+        # Databases created before posts had a processing state
+        columns = [r["name"] for r in self._conn.execute("PRAGMA table_info(posts)")]
+        if "status" not in columns:
+            self._conn.execute("ALTER TABLE posts ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+
+    def _pair(self, user_id, friend_id):
+        return min(user_id, friend_id), max(user_id, friend_id)
+
+    def _user_row(self, u):
+        return tuple(json.dumps(u[c]) if c in USER_LIST_COLUMNS else u[c] for c in USER_COLUMNS)
+
+    def _user_record(self, row):
+        return {c: json.loads(row[c]) if c in USER_LIST_COLUMNS else row[c] for c in USER_COLUMNS}
+
+    def _chat_record(self, row):
+        return {"chat_id": row["chat_id"], "sender": row["sender"], "receiver": row["receiver"], "content": row["content"]}
+
+    def _post_record(self, row):
+        return {"chat_id": row["post_id"], "user_id": row["user_id"], "image_path": row["image_path"], "datetime": row["datetime"],
+                "status": row["status"]}
+
+    def _next_id(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (NEXT_ID_KEYS[key],)).fetchone()
+        return row[0] if row else 1
+
+    def signature(self, key):
+        with self._lock:
+            return self._signature(key)
+
+    def _signature(self, key):
+        # Every save that changes rows bumps a per-collection generation; chats also expose the
+        # next id and the last unfriend deletion, so sends and deletions can be tailed. The next id
+        # rather than MAX(chat_id), which a deletion can lower.
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (f"gen_{key}",)).fetchone()
+        sig = (row[0] if row else 0,)
+        if key == "chats":
+            sig += (max(self._next_id(key), (self._conn.execute("SELECT MAX(chat_id) FROM chats").fetchone()[0] or 0) + 1),
+                    self._conn.execute("SELECT MAX(seq) FROM chat_drops").fetchone()[0] or 0)
+        return sig
+
+    def load_changed(self, key, old_sig=None):
+        # Returns (status, records, next_id, sig); status is "unchanged", "appended" or "full"
+        with self._lock:
+            sig = self._signature(key)
+            if old_sig is not None and sig == old_sig:
+                return "unchanged", [], None, sig
+            if key == "chats" and old_sig is not None and sig[0] == old_sig[0]:
+                # New messages first, then deletions: a deletion only removes messages that are
+                # already gone from the table, so none of the new rows are affected by it
+                rows = self._conn.execute("SELECT * FROM chats WHERE chat_id >= ? ORDER BY chat_id",
+                                          (old_sig[1],)).fetchall()
+                drops = self._conn.execute("SELECT * FROM chat_drops WHERE seq > ? ORDER BY seq",
+                                           (old_sig[2],)).fetchall()
+                records = [self._chat_record(r) for r in rows]
+                records += [{"drop": [r["user_a"], r["user_b"]], "before": r["before"]} for r in drops]
+                return "appended", records, None, sig
+            records, next_id = self._load_locked(key)
+        return "full", records, next_id, sig
+
+    def load(self, key):
+        with self._lock:
+            return self._load_locked(key)
+
+    def _load_locked(self, key):
+        if key == "users":
+            rows = self._conn.execute("SELECT * FROM users ORDER BY user_id").fetchall()
+            records = [self._user_record(r) for r in rows]
+        elif key == "chats":
+            rows = self._conn.execute("SELECT * FROM chats ORDER BY chat_id").fetchall()
+            records = [self._chat_record(r) for r in rows]
+        elif key == "posts":
+            rows = self._conn.execute("SELECT * FROM posts ORDER BY post_id").fetchall()
+            records = [self._post_record(r) for r in rows]
+        else:
+            rows = self._conn.execute("SELECT user_id, date, mood FROM moods ORDER BY user_id, date").fetchall()
+            by_user = {}
+            for r in rows:
+                by_user.setdefault(r["user_id"], []).append({"date": r["date"], "mood": r["mood"]})
+            records = [{"user_id": uid, "moods": moods} for uid, moods in by_user.items()]
+        if key in ROW_KEYS:
+            self._rows[key] = self._table_rows(key, records)
+        next_id = self._next_id(key) if NEXT_ID_KEYS[key] else 1
+        return records, next_id
+
+    def _table_rows(self, key, records):
+        # {primary key: row tuple} for the users, posts and moods tables
+        if key == "users":
+            return {(u["user_id"],): self._user_row(u) for u in records}
+        elif key == "posts":
+            return {(p["chat_id"],): (p["chat_id"], p["user_id"], p["image_path"], p["datetime"], p.get("status", "ready"))
+                    for p in records}
+        return {(m["user_id"], d["date"]): (m["user_id"], d["date"], d["mood"])
+                for m in mood_file.as_lists(records) for d in m["moods"]}
+
+    def save(self, key, records, next_id=None):
+        # Brings one collection in line with records inside a single transaction, writing
+        # only the rows that were added, changed or removed. Returns the bytes of those rows.
+        with self._lock, self._conn:
+            if key == "chats":
+                written = self._save_chats(records)
+                rows = None
+            else:
+                if key not in self._rows:
+                    self._load_locked(key)
+                old, rows = self._rows[key], self._table_rows(key, records)
+                gone = [k for k in old if k not in rows]
+                changed = [row for k, row in rows.items() if old.get(k) != row]
+                where = " AND ".join(f"{c} = ?" for c in ROW_KEYS[key])
+                self._conn.executemany(f"DELETE FROM {key} WHERE {where}", gone)
+                if changed:
+                    marks = ", ".join("?" * len(changed[0]))
+                    self._conn.executemany(f"INSERT OR REPLACE INTO {key} VALUES ({marks})", changed)
+                written = len(json.dumps(changed).encode("utf-8")) if changed or gone else 0
+            if NEXT_ID_KEYS[key]:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (NEXT_ID_KEYS[key], next_id or 1))
+            if written:
+                self._bump_generation(key)
+        if rows is not None:
+            self._rows[key] = rows
+        return written
+
+    def _save_chats(self, records):
+        # Chats are never edited, so comparing ids is enough
+        stored = {r[0] for r in self._conn.execute("SELECT chat_id FROM chats")}
+        ids = {c["chat_id"] for c in records}
+        gone = [(i,) for i in stored - ids]
+        added = [(c["chat_id"], c["sender"], c["receiver"], c["content"], *self._pair(c["sender"], c["receiver"]))
+                 for c in records if c["chat_id"] not in stored]
+        self._conn.executemany("DELETE FROM chats WHERE chat_id = ?", gone)
+        self._conn.executemany("INSERT INTO chats VALUES (?, ?, ?, ?, ?, ?)", added)
+        return len(json.dumps(added).encode("utf-8")) if added or gone else 0
+
+    def append_chat(self, record):
+        # The INSERT picks the id itself, inside the write transaction, so processes can't collide.
+        # Returns (chat_id, bytes).
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO chats SELECT MAX(COALESCE((SELECT value FROM meta WHERE key = 'next_chat_id'), 1), "
+                "COALESCE((SELECT MAX(chat_id) FROM chats), 0) + 1), ?, ?, ?, ?, ?",
+                (record["sender"], record["receiver"], record["content"],
+                 *self._pair(record["sender"], record["receiver"])))
+            chat_id = cur.lastrowid
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('next_chat_id', ?)", (chat_id + 1,))
+        return chat_id, len(json.dumps({"chat_id": chat_id, **record}).encode("utf-8"))
+
+    def delete_conversation(self, user_id, friend_id, before_chat_id):
+        # Served by the pair index; other processes pick the deletion up from chat_drops
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chats WHERE user_lo = ? AND user_hi = ? AND chat_id < ?",
+                               (*self._pair(user_id, friend_id), before_chat_id))
+            self._conn.execute("INSERT INTO chat_drops (user_a, user_b, before) VALUES (?, ?, ?)",
+                               (user_id, friend_id, before_chat_id))
+        return 0
+
+    def _bump_generation(self, key):
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES (?, 0)", (f"gen_{key}",))
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (f"gen_{key}",))
+
+    # ------------------- Queries ------------------- #
+    def chat_history(self, user_id, friend_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM chats WHERE user_lo = ? AND user_hi = ? ORDER BY chat_id",
+                                      self._pair(user_id, friend_id)).fetchall()
+        return [self._chat_record(r) for r in rows]
+
+    def chat_since(self, user_id, friend_id, after_chat_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM chats WHERE user_lo = ? AND user_hi = ? AND chat_id > ? ORDER BY chat_id",
+                                      (*self._pair(user_id, friend_id), after_chat_id)).fetchall()
+        return [self._chat_record(r) for r in rows]
+
+    def chat_page(self, user_id, friend_id, before_chat_id=None, limit=30):
+        # Walks the pair index backwards from before_chat_id, so only limit rows are touched
+        sql = "SELECT * FROM chats WHERE user_lo = ? AND user_hi = ?"
+        params = self._pair(user_id, friend_id)
+        if before_chat_id is not None:
+            sql += " AND chat_id < ?"
+            params += (before_chat_id,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY chat_id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._chat_record(r) for r in reversed(rows)]
+
+    def posts_for(self, user_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM posts WHERE user_id = ? ORDER BY post_id", (user_id,)).fetchall()
+        return [self._post_record(r) for r in rows]
+
+    def posts_page(self, user_id, offset=0, limit=9):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM posts WHERE user_id = ? ORDER BY post_id DESC LIMIT ? OFFSET ?",
+                                      (user_id, limit, offset)).fetchall()
+        return [self._post_record(r) for r in rows]